@@ -1,2 +1,4 @@
 from .table import Table
-__all__ = ['Table']
+from .aio import AsyncTable
+from .util import close_pools, set_profile, transaction
+__all__ = ['Table', 'AsyncTable', 'close_pools', 'set_profile', 'transaction']
@@ -0,0 +1,274 @@
+import asyncio
+import atexit
+import collections
+import threading
+
+from concurrent.futures import Future
+
+from .table import Table
+from .util import transaction, _pool_key
+
+
+class _Job(object):
+
+    def __init__(self, func, args, kwargs, write):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.write = write
+        self.future = Future()
+
+    def run(self):
+        r"""
+        Run the job and set the result (or exception) of its future,
+        which should already have been marked as running.
+
+        """
+
+        try:
+            result = self.func(*self.args, **self.kwargs)
+        except Exception as err:
+            self.future.set_exception(err)
+        else:
+            self.future.set_result(result)
+
+
+class _Worker(object):
+    r"""
+    A thread that runs the operations on a database one at a time, in
+    the order in which they were submitted. Consecutive write operations
+    that are queued up are run in a single transaction.
+
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._jobs = collections.deque()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(
+            target=self._run, name="dbtools worker: %s" % db)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def submit(self, func, args, kwargs, write):
+        r"""
+        Queue a call to `func`, and return a future for its result.
+
+        """
+
+        job = _Job(func, args, kwargs, write)
+        with self._cond:
+            if self._stopped:
+                raise ValueError("worker is stopped: %s" % self.db)
+            self._jobs.append(job)
+            self._cond.notify()
+        return job.future
+
+    def stop(self):
+        r"""
+        Stop the worker once it has run all of the queued jobs.
+
+        """
+
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while len(self._jobs) == 0 and not self._stopped:
+                    self._cond.wait()
+                if len(self._jobs) == 0:
+                    break
+                # take the next job, and any writes that are queued up
+                # directly behind it
+                batch = [self._jobs.popleft()]
+                if batch[0].write:
+                    while len(self._jobs) > 0 and self._jobs[0].write:
+                        batch.append(self._jobs.popleft())
+
+            self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        # skip the jobs that were cancelled while they were queued
+        batch = [job for job in batch
+                 if job.future.set_running_or_notify_cancel()]
+        if len(batch) == 0:
+            return
+        if len(batch) == 1:
+            batch[0].run()
+            return
+
+        # run all of the writes in one transaction, each within its own
+        # savepoint, so that a failing write is rolled back on its own
+        # (rather than being retried, which could not replay arguments
+        # such as generators that it has already consumed)
+        outcomes = []
+        try:
+            with transaction(self.db) as conn:
+                for job in batch:
+                    conn.execute("SAVEPOINT dbtools_job")
+                    try:
+                        result = job.func(*job.args, **job.kwargs)
+                    except Exception as err:
+                        conn.execute("ROLLBACK TO dbtools_job")
+                        outcomes.append((False, err))
+                    else:
+                        outcomes.append((True, result))
+                    conn.execute("RELEASE dbtools_job")
+        except Exception as err:
+            # the commit failed, so none of the writes were made
+            for job in batch:
+                job.future.set_exception(err)
+            return
+
+        for job, (ok, value) in zip(batch, outcomes):
+            if ok:
+                job.future.set_result(value)
+            else:
+                job.future.set_exception(value)
+
+
+_workers = {}
+_workers_lock = threading.Lock()
+
+
+def _get_worker(db):
+    key = _pool_key(db)
+    with _workers_lock:
+        worker = _workers.get(key, None)
+        if worker is None:
+            worker = _Worker(db)
+            _workers[key] = worker
+    return worker
+
+
+def stop_workers():
+    r"""
+    Stop the worker threads of all :class:`AsyncTable` objects, after
+    they have finished their queued operations. This is called
+    automatically when the interpreter exits.
+
+    """
+
+    with _workers_lock:
+        workers = list(_workers.values())
+        _workers.clear()
+    for worker in workers:
+        worker.stop()
+
+
+atexit.register(stop_workers)
+
+
+class AsyncTable(object):
+    r"""
+    An asyncio interface to the SQLite table `name` in the database
+    `db`, e.g.::
+
+        tbl = AsyncTable("data.db", "People")
+        await tbl.insert(["Alyssa P. Hacker", 25, 66.24])
+        data = await tbl.select(where=("age>?", 24))
+
+    The methods have the same arguments as those of
+    :class:`dbtools.Table`, but return awaitables instead of blocking.
+    The operations are run by a worker thread (one per database) in the
+    order in which they are called. Writes (``insert``, ``upsert``,
+    ``update``, ``update_many`` and ``delete``) that queue up behind
+    each other are committed together in a single transaction, each in
+    its own savepoint, so a write that fails is rolled back without
+    affecting the others.
+
+    Parameters
+    ----------
+    db : string
+        Path to the SQLite database.
+    name : string
+        Name of the table in the database.
+    kwargs : (optional)
+        Other arguments for :class:`dbtools.Table`.
+
+    """
+
+    def __init__(self, db, name, **kwargs):
+        self.table = Table(db, name, **kwargs)
+        self._worker = _get_worker(self.table.db)
+
+    def _submit(self, func, args, kwargs, write):
+        future = self._worker.submit(func, args, kwargs, write)
+        return asyncio.wrap_future(future)
+
+    def select(self, *args, **kwargs):
+        r"""
+        See :meth:`dbtools.Table.select`.
+
+        """
+
+        if kwargs.get('chunksize', None) is not None:
+            raise ValueError("chunked selects are not supported")
+        return self._submit(self.table.select, args, kwargs, False)
+
+    def count(self, *args, **kwargs):
+        r"""
+        See :meth:`dbtools.Table.count`.
+
+        """
+
+        return self._submit(self.table.count, args, kwargs, False)
+
+    def aggregate(self, *args, **kwargs):
+        r"""
+        See :meth:`dbtools.Table.aggregate`.
+
+        """
+
+        return self._submit(self.table.aggregate, args, kwargs, False)
+
+    def insert(self, *args, **kwargs):
+        r"""
+        See :meth:`dbtools.Table.insert`.
+
+        """
+
+        return self._submit(self.table.insert, args, kwargs, True)
+
+    def upsert(self, *args, **kwargs):
+        r"""
+        See :meth:`dbtools.Table.upsert`.
+
+        """
+
+        return self._submit(self.table.upsert, args, kwargs, True)
+
+    def update(self, *args, **kwargs):
+        r"""
+        See :meth:`dbtools.Table.update`.
+
+        """
+
+        return self._submit(self.table.update, args, kwargs, True)
+
+    def update_many(self, *args, **kwargs):
+        r"""
+        See :meth:`dbtools.Table.update_many`.
+
+        """
+
+        return self._submit(self.table.update_many, args, kwargs, True)
+
+    def delete(self, *args, **kwargs):
+        r"""
+        See :meth:`dbtools.Table.delete`.
+
+        """
+
+        return self._submit(self.table.delete, args, kwargs, True)
+
+    def __repr__(self):
+        return repr(self.table)
+
+    def __str__(self):
+        return str(self.table)
@@ -1,14 +1,73 @@
-import numpy as np
+import base64
+import csv
+import itertools
+import json
+import multiprocessing
 import pandas as pd
 import re
 import os
-
-from .util import sql_execute, dict_to_dtypes, int_types, string_types, blob_type
+import sqlite3
+
+from .util import sql_execute, sql_executemany, sql_iterate
+from .util import dicts_to_rows, frame_to_columns, rows_to_frame
+from .util import is_columnar, arrays_to_columns
+from .util import transaction, get_schema, table_info, open_text
+from .util import text_to_dtypes, require_pyarrow, arrow_schema
+from .util import rows_to_batch, arrow_to_dtypes, set_profile, get_pool
+from .util import readonly_uri, db_path, get_query_cache, in_transaction
+from .util import profile_pragmas, require_sqlite
+from .util import int_types, string_types, blob_type
+from .writer import TableWriter
 
 try:
-    xrange
-except NameError:
-    xrange = range
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# maximum number of generated SQL statements to memoize per table
+_MAX_STATEMENTS = 256
+
+# SQL aggregate functions for the names accepted by `Table.aggregate`
+_AGGREGATES = {
+    'count': 'COUNT',
+    'sum': 'SUM',
+    'mean': 'AVG',
+    'min': 'MIN',
+    'max': 'MAX',
+}
+
+
+def _select_partition(task):
+    r"""
+    Run one partition of :meth:`Table.select_parallel` in a worker
+    process, on its own read-only connection.
+
+    """
+
+    uri, cmd, cols, affinities, index = task
+    conn = sqlite3.connect(uri, uri=True)
+    try:
+        rows = conn.execute(*cmd).fetchall()
+    finally:
+        conn.close()
+    return rows_to_frame(rows, cols, affinities, index=index)
+
+
+def _load_pragmas(synchronous=None, journal_mode=None):
+    r"""
+    Build the pragmas to set while loading a CSV file (see
+    :meth:`Table.load_csv`).
+
+    """
+
+    pragmas = {}
+    if synchronous is not None:
+        pragmas['synchronous'] = synchronous
+    if journal_mode is not None:
+        pragmas['journal_mode'] = journal_mode
+    return pragmas
+
 
 class Table(object):
 
@@ -32,16 +91,12 @@ class Table(object):
         """
 
         # if the database doesn't exist, throw an error
-        if not os.path.exists(db):
+        if not os.path.exists(db_path(db)):
             raise ValueError("no such database: %s" % db)
 
-        # select the names of all tables in the database
-        cmd = "SELECT name FROM sqlite_master WHERE type='table'"
-        result = sql_execute(db, cmd, fetchall=True, verbose=verbose)
-
-        # try to match `name` to one of the table names
-        tables = [table[0] for table in result]
-        return tables
+        # get the names of all tables in the database
+        schema = get_schema(db, verbose=verbose)
+        return list(schema.names)
 
     @classmethod
     def exists(cls, db, name, verbose=False):
@@ -65,22 +120,17 @@ class Table(object):
         """
 
         # if the database doesn't exist, neither does the table
-        if not os.path.exists(db):
+        if not os.path.exists(db_path(db)):
             return False
 
-        # select the names of all tables in the database
-        cmd = "SELECT name FROM sqlite_master WHERE type='table'"
-        result = sql_execute(db, cmd, fetchall=True, verbose=verbose)
-
         # try to match `name` to one of the table names
-        for table in result:
-            if name == table[0]:
-                return True
-        return False
+        schema = get_schema(db, verbose=verbose)
+        return name in schema.tables
 
     @classmethod
     def create(cls, db, name, init, primary_key=None,
-               autoincrement=False, verbose=False):
+               autoincrement=False, verbose=False, profile=None,
+               sample=None):
         r"""
         Create a table called `name` in the database `db`.
 
@@ -98,7 +148,8 @@ class Table(object):
 
                The column names of the DataFrame will be used as column
                names in the table, and the datatype of each column will
-               be inferred by the first row of data in the DataFrame.
+               be inferred from its dtype (or, for object columns, from
+               its first non-null value).
 
                If the DataFrame has an index name, a primary key column
                will be created (it will also be ``AUTOINCREMENT`` if
@@ -113,7 +164,9 @@ class Table(object):
                The dictionary keys will be used as column names in the
                table, in alphabetical order, and the datatype of each
                column will be inferred from the corresponding values in
-               the dictionary or dictionaries.
+               the dictionary or dictionaries (or only in the first
+               `sample` of them, see
+               :func:`dbtools.util.dict_to_dtypes`).
 
                If `primary_key` is given and it corresponds to a key
                name, that column will be created with ``PRIMARY KEY``
@@ -125,13 +178,27 @@ class Table(object):
                The Table data will be populated with appropriate values
                from the dictionary or dictionaries.
 
+        4. `init` is a dictionary of columns, or a numpy structured
+           array.
+
+               A dictionary whose values are all arrays or lists, e.g.
+               ``{'age': np.array([25, 24]), 'name': ['Alyssa', 'Ben']}``,
+               is treated as a set of columns, in the order of its keys.
+               The datatype of each column will be taken from the dtype
+               of its array, as for a DataFrame. Similarly, the fields
+               of a structured array are used as the columns.
+
+               The primary key is handled as for dictionaries, and the
+               Table data will be populated with the values of the
+               columns.
+
         Parameters
         ----------
         db : string
             Path to the SQLite database.
         name : string
             Name of the desired table.
-        init : list, pandas.DataFrame, or dictionary
+        init : list, pandas.DataFrame, dictionary or numpy.ndarray
             See above
         primary_key : string (optional)
             Name of the primary key column. If None, no primary key is
@@ -140,6 +207,14 @@ class Table(object):
             Set the primary key column to automatically increment.
         verbose : bool (optional)
             Print out SQL command information.
+        profile : string or dict (optional)
+            Pragmas to apply to connections to the database (see
+            :func:`dbtools.util.set_profile`).
+        sample : int (optional)
+            If `init` is a list of dictionaries, only infer the column
+            types from the first `sample` of them. The values of the
+            others are checked against those types, and a ValueError is
+            raised (before the table is created) if they do not fit.
 
         Returns
         -------
@@ -148,6 +223,9 @@ class Table(object):
 
         """
 
+        if profile is not None:
+            set_profile(db, profile)
+
         if isinstance(init, pd.DataFrame):
             ## populate the table with the contents from a dataframe
 
@@ -157,20 +235,31 @@ class Table(object):
                 if primary_key is not None and primary_key != idx.name:
                     raise ValueError("primary key mismatch")
                 primary_key = idx.name
-            # extract the data and column names
-            data = [list(init.as_matrix()[i]) for i in xrange(len(init))]
-            names = list(init.columns)
-            if idx.name is not None:
-                for i in xrange(len(init)):
-                    data[i].insert(0, idx[i])
-                names.insert(0, primary_key)
-            # parse data types
-            d = dict(zip(names, data[0]))
-            dtypes = dict_to_dtypes(d, order=names)
-            # coerce data with the data types we just extracted
-            data = [[dtypes[i][1](x[i]) for i in xrange(len(x))] for x in data]
+            # extract the column names, data types and data, one column
+            # at a time
+            dtypes, columns = frame_to_columns(init)
+            names = [label for label, dtype in dtypes]
+            # the rows are built lazily from the columns as they are
+            # inserted
+            rows = zip(*columns)
+            data = None
             # insert primary key column, if requested
-            if primary_key is not None and primary_key not in list(zip(*dtypes))[0]:
+            if primary_key is not None and primary_key not in names:
+                dtypes.insert(0, (primary_key, int))
+
+        elif is_columnar(init):
+            ## populate the table with the contents from a mapping of
+            ## column names to arrays, or from a structured array
+
+            # the data types are taken from the array dtypes, and the
+            # rows are built lazily from the columns as they are
+            # inserted
+            dtypes, columns = arrays_to_columns(init)
+            names = [label for label, dtype in dtypes]
+            rows = zip(*columns)
+            data = None
+            # insert primary key column, if requested
+            if primary_key is not None and primary_key not in names:
                 dtypes.insert(0, (primary_key, int))
 
         elif hasattr(init, 'keys') or (
@@ -179,16 +268,16 @@ class Table(object):
 
             if hasattr(init, 'keys'):
                 init = [init]
-            dtypes = dict_to_dtypes(init)
-            data = [[dtype(init[i][col]) for col, dtype in dtypes]
-                    for i in xrange(len(init))]
+            dtypes, rows = dicts_to_rows(init, sample=sample)
+            names = dtypes.names
+            data = None
             # insert primary key column, if requested
             if primary_key is not None and primary_key not in list(zip(*dtypes))[0]:
                 dtypes.insert(0, (primary_key, int))
 
         else:
             dtypes = init
-            data = None
+            data = names = rows = None
 
         args = []
 
@@ -196,7 +285,7 @@ class Table(object):
             # parse the python type into a SQL type
             if dtype is None:
                 sqltype = "NULL"
-            elif dtype in int_types:
+            elif dtype in int_types or dtype is bool:
                 sqltype = "INTEGER"
             elif dtype is float:
                 sqltype = "REAL"
@@ -229,10 +318,147 @@ class Table(object):
         # insert data, if it was given
         if data is not None:
             tbl.insert(values=data)
+        elif rows is not None:
+            tbl._insert_rows(names, rows)
+
+        return tbl
+
+    @classmethod
+    def create_from_csv(cls, db, name, path, dtypes=None, primary_key=None,
+                        autoincrement=False, sample=1000, verbose=False,
+                        **kwargs):
+        r"""
+        Create a table called `name` in the database `db` and load the
+        contents of a CSV file into it.
+
+        The first line of the file should hold the column names. Unless
+        `dtypes` is given, the datatype of each column is inferred from
+        the first `sample` rows of the file (see
+        :func:`dbtools.util.text_to_dtypes`).
+
+        Parameters
+        ----------
+        db : string
+            Path to the SQLite database.
+        name : string
+            Name of the desired table.
+        path : string or file
+            Path to the csv file, or an open file.
+        dtypes : list of 2-tuples (optional)
+            The columns of the table (see :meth:`~dbtools.Table.create`).
+        primary_key : string (optional)
+            See :meth:`~dbtools.Table.create`
+        autoincrement : bool (optional)
+            See :meth:`~dbtools.Table.create`
+        sample : int (optional)
+            Number of rows to infer the datatypes from.
+        verbose : bool (optional)
+            Print out SQL command information.
+        kwargs : (optional)
+            Other arguments for :meth:`~dbtools.Table.load_csv`.
+
+        Returns
+        -------
+        tbl : dbtools.Table
+            Newly created Table object
+
+        """
+
+        compression = kwargs.pop('compression', None)
+        if hasattr(path, 'read'):
+            f = path
+        else:
+            f = open_text(path, 'r', compression=compression)
+
+        try:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if header is None:
+                raise ValueError("no header row in CSV file")
+            first = list(itertools.islice(reader, sample))
+
+            # parse data types from the sample
+            if dtypes is None:
+                dtypes = text_to_dtypes(header, first)
+                if primary_key is not None and primary_key not in header:
+                    dtypes.insert(0, (primary_key, int))
+
+            # create the table and load the rows in one transaction, so
+            # that the table is not left behind if the load fails -- the
+            # pragmas for the load have to be set on this outer
+            # transaction, as the load's own is merged into it
+            pragmas = _load_pragmas(kwargs.get('synchronous'),
+                                    kwargs.get('journal_mode'))
+            with transaction(db, pragmas=pragmas):
+                tbl = cls.create(db, name, dtypes, primary_key=primary_key,
+                                 autoincrement=autoincrement,
+                                 verbose=verbose)
+                tbl._load_rows(
+                    header, itertools.chain(first, reader), **kwargs)
+
+        finally:
+            if f is not path:
+                f.close()
 
         return tbl
 
-    def __init__(self, db, name, verbose=False):
+    @classmethod
+    def from_parquet(cls, db, name, path, primary_key=None,
+                     autoincrement=False, batch_size=65536, verbose=False):
+        r"""
+        Create a table called `name` in the database `db` and load the
+        contents of a Parquet file into it.
+
+        The columns of the table are taken from the schema of the file.
+        The file is read in batches of `batch_size` rows, which are
+        inserted within a single transaction. Requires pyarrow.
+
+        Parameters
+        ----------
+        db : string
+            Path to the SQLite database.
+        name : string
+            Name of the desired table.
+        path : string
+            Path to the Parquet file.
+        primary_key : string (optional)
+            See :meth:`~dbtools.Table.create`
+        autoincrement : bool (optional)
+            See :meth:`~dbtools.Table.create`
+        batch_size : int (optional)
+            Number of rows to read from the file at a time.
+        verbose : bool (optional)
+            Print out SQL command information.
+
+        Returns
+        -------
+        tbl : dbtools.Table
+            Newly created Table object
+
+        """
+
+        require_pyarrow()
+        pf = pq.ParquetFile(path)
+        schema = pf.schema_arrow
+        names = list(schema.names)
+
+        dtypes = arrow_to_dtypes(schema)
+        if primary_key is not None and primary_key not in names:
+            dtypes.insert(0, (primary_key, int))
+
+        tbl = cls.create(db, name, dtypes, primary_key=primary_key,
+                         autoincrement=autoincrement, verbose=verbose)
+
+        with tbl.transaction():
+            for batch in pf.iter_batches(batch_size=batch_size):
+                columns = [batch.column(i).to_pylist()
+                           for i in range(batch.num_columns)]
+                tbl._insert_rows(names, zip(*columns))
+
+        return tbl
+
+    def __init__(self, db, name, verbose=False, advise=False, profile=None,
+                 readonly=False, mmap=None, cache=False):
         r"""
         Creates a frame-like interface to the SQLite table `name` in the
         database `db`.
@@ -245,58 +471,196 @@ class Table(object):
             The name of the table in the database.
         verbose : bool (default=False)
             Print out SQL command information.
+        advise : bool (default=False)
+            Record the ``WHERE`` clauses that are used to query the
+            table, so that :meth:`~dbtools.Table.suggest_indexes` can
+            suggest indexes for them.
+        profile : string or dict (default=None)
+            Pragmas to apply to connections to the database, e.g.
+            'performance' (see :func:`dbtools.util.set_profile`). If
+            None, the database's current settings are kept.
+        readonly : bool (default=False)
+            Open the database in read-only mode. Read-only connections
+            are kept open for as long as the process runs (or until
+            :func:`dbtools.close_pools` is called), so that repeated
+            selects can reuse the database pages that they have
+            already read. The `db` attribute is then a read-only URI
+            (see :func:`dbtools.util.readonly_uri`).
+        mmap : int (default=None)
+            Number of bytes of the database file to access through
+            memory-mapped I/O (``PRAGMA mmap_size``), which avoids
+            copying pages from the operating system's cache. This is
+            mostly useful together with `readonly`.
+        cache : bool or dict (default=False)
+            Cache the results of :meth:`~dbtools.Table.select`, so that
+            repeating a query returns a copy of the previous result
+            until the database changes. If a dictionary is given, it
+            holds options for the cache, e.g. ``{'max_entries': 32,
+            'max_bytes': 2**30}`` (see
+            :class:`dbtools.util.QueryCache`). The cache is shared by
+            all tables in the database.
 
         """
 
         # save the parameters
-        self.db = str(db)
+        if readonly:
+            self.db = readonly_uri(db)
+            get_pool(self.db, idle_timeout=None)
+        else:
+            self.db = str(db)
         self.name = str(name)
         self.verbose = bool(verbose)
 
-        if not self.exists(self.db, self.name, self.verbose):
+        # apply the profile and mmap size together, so that the pool
+        # (and its open connections) is left alone if they are unchanged
+        if profile is not None or mmap is not None:
+            if profile is not None:
+                pragmas = profile_pragmas(profile)
+            else:
+                pragmas = dict(get_pool(self.db).pragmas)
+            if mmap is not None:
+                pragmas['mmap_size'] = int(mmap)
+            get_pool(self.db, pragmas=pragmas)
+        self._cache = bool(cache)
+        if hasattr(cache, 'keys'):
+            get_query_cache(self.db, **cache)
+
+        # maps WHERE clauses to the number of times they were used and
+        # the arguments they were last used with
+        if advise:
+            self._where_log = {}
+        else:
+            self._where_log = None
+
+        # look up the table in the (cached) database schema
+        if os.path.exists(db_path(self.db)):
+            schema = get_schema(self.db, verbose=self.verbose)
+        else:
+            schema = None
+        if schema is None or self.name not in schema.tables:
             raise ValueError(
                 "No such table: %s\n\n"
                 "**  If you were trying to create a new table, please\n"
                 "**  use `Table.create` instead." % name)
 
-        # query the database for information about the table
-        cmd = ("SELECT sql FROM sqlite_master "
-               "WHERE tbl_name='%s' and type='table'" % name)
-        info = sql_execute(self.db, cmd, fetchall=True, verbose=verbose)
-
-        # parse the response -- it will look like 'CREATE TABLE
-        # name(col1 TYPE, col2 TYPE, ...)'
-        args = re.match("([^\(]*)\((.*)\)", info[0][0]).groups()[1]
-
-        # compute repr string
-        self.repr = "%s(%s)" % (self.name, args)
-
-        # get the column names
-        cols = [a.strip() for a in args.split(",")]
-        self.columns = tuple([x.split(" ")[0] for x in cols])
-
-        # parse primary key, if any
-        pk = [bool(re.search(r"PRIMARY KEY", x)) for x in cols]
-        primary_key = np.nonzero(pk)[0]
-        if len(primary_key) > 1:
-            raise ValueError("more than one primary key: %s" % primary_key)
-        elif len(primary_key) == 1:
-            self.primary_key = self.columns[primary_key[0]]
+        # parse information about the table, unless it has already been
+        # parsed since the schema last changed
+        info = schema.info.get(self.name, None)
+        if info is None:
+            info = self._parse_info(schema.tables[self.name])
+            schema.info[self.name] = info
+
+        self.repr = info['repr']
+        self.column_info = info['column_info']
+        self.columns = info['columns']
+        self.primary_key = info['primary_key']
+        self.autoincrement = info['autoincrement']
+        self._affinities = info['affinities']
+        self._statements = info['statements']
+
+    def _parse_info(self, sql):
+        r"""
+        Helper function to get information about the table's columns
+        with ``PRAGMA table_info``, given its ``CREATE TABLE``
+        statement `sql`.
+
+        Returns
+        -------
+        info : dict
+            Dictionary with the table's repr string, column information,
+            column names, primary key, whether the primary key
+            autoincrements, and the type affinity of each column.
+
+        """
+
+        info = {}
+
+        # compute repr string from the column definitions in the
+        # statement -- it will look like 'CREATE TABLE name(col1 TYPE,
+        # col2 TYPE, ...)'
+        args = re.match(r"[^\(]*\((.*)\)", sql, re.DOTALL).groups()[0]
+        info['repr'] = "%s(%s)" % (self.name, args)
+
+        # get the column information
+        column_info = table_info(self.db, self.name, verbose=self.verbose)
+        info['column_info'] = column_info
+        info['columns'] = tuple([col.name for col in column_info])
+        info['affinities'] = dict(
+            [(col.name, col.affinity) for col in column_info])
+
+        # get the primary key, if any -- a composite key (PRIMARY
+        # KEY(a, b)) has no single column to index the data by, so it
+        # is only recorded in the per-column information
+        primary_key = [col.name for col in column_info if col.primary_key]
+        if len(primary_key) == 1:
+            info['primary_key'] = primary_key[0]
         else:
-            self.primary_key = None
-
-        # parse autoincrement, if applicable
-        ai = [bool(re.search(r"AUTOINCREMENT", x)) for x in cols]
-        autoincrement = np.nonzero(ai)[0]
-        if len(autoincrement) > 1:
-            raise ValueError("more than one autoincrementing "
-                             "column: %s" % autoincrement)
-        elif self.primary_key is not None and len(autoincrement) == 1:
-            if self.primary_key != self.columns[autoincrement[0]]:
-                raise ValueError("autoincrement is different from primary key")
-            self.autoincrement = True
+            info['primary_key'] = None
+
+        # SQLite only allows AUTOINCREMENT on an INTEGER PRIMARY KEY, so
+        # if it is present, it belongs to the primary key
+        info['autoincrement'] = bool(
+            re.search(r"\bAUTOINCREMENT\b", sql, re.IGNORECASE))
+
+        # generated SQL statements (see `_statement`), which are shared
+        # by all Table objects until the schema changes
+        info['statements'] = {}
+
+        return info
+
+    def _statement(self, op, cols=(), where_str=""):
+        r"""
+        Helper function to get the SQL text of a ``SELECT``,
+        ``INSERT``, ``UPDATE`` or ``DELETE`` on the table. The text is
+        memoized by (`op`, `cols`, `where_str`), so that building it is
+        a single dictionary lookup and the same text is passed to
+        SQLite each time, which lets connections reuse the compiled
+        statement.
+
+        Parameters
+        ----------
+        op : string
+            The operation, one of "SELECT", "INSERT", "UPDATE" or
+            "DELETE".
+        cols : sequence of strings
+            The columns to select, insert, or update.
+        where_str : string
+            The ``WHERE`` statement, as returned by
+            :meth:`~dbtools.Table._where`.
+
+        Returns
+        -------
+        cmd : string
+            The SQL statement.
+
+        """
+
+        key = (op, tuple(cols), where_str)
+        cmd = self._statements.get(key, None)
+        if cmd is not None:
+            return cmd
+
+        if op == "SELECT":
+            cmd = "SELECT %s FROM %s%s" % (",".join(cols), self.name, where_str)
+        elif op == "INSERT":
+            cmd = "INSERT INTO %s(%s) VALUES (%s)" % (
+                self.name, ", ".join(cols), ", ".join(["?"] * len(cols)))
+        elif op == "UPDATE":
+            cmd = "UPDATE %s SET %s%s" % (
+                self.name, ", ".join(["%s=?" % col for col in cols]),
+                where_str)
+        elif op == "DELETE":
+            cmd = "DELETE FROM %s%s" % (self.name, where_str)
         else:
-            self.autoincrement = False
+            raise ValueError("invalid operation: %s" % op)
+
+        # don't let the cache grow without bound if the WHERE statements
+        # have their values written into them
+        if len(self._statements) >= _MAX_STATEMENTS:
+            self._statements.clear()
+        self._statements[key] = cmd
+
+        return cmd
 
     def _where(self, args):
         r"""
@@ -339,11 +703,32 @@ class Table(object):
                 if isinstance(where_args, string_types) or not hasattr(where_args, '__iter__'):
                     where_args = (where_args,)
                 out = (query, where_args)
+            # record the clause for the index advisor
+            if self._where_log is not None:
+                count = self._where_log.get(where_str, (0, None))[0]
+                self._where_log[where_str] = (count + 1, out[1])
         else:
             out = ("", [])
 
         return out
 
+    def transaction(self):
+        r"""
+        Run several operations on the table (or other tables in the
+        same database) within a single transaction, e.g.::
+
+            with tbl.transaction():
+                tbl.insert(["Alyssa P. Hacker", 25, 66.24])
+                tbl.delete(where="age>30")
+
+        The changes are committed together when the ``with`` block
+        exits, or rolled back if it raises an exception. See
+        :func:`dbtools.util.transaction`.
+
+        """
+
+        return transaction(self.db)
+
     def drop(self):
         r"""
         Drop the table from its database.
@@ -357,7 +742,147 @@ class Table(object):
         cmd = "DROP TABLE %s" % self.name
         sql_execute(self.db, cmd, verbose=self.verbose)
 
-    def insert(self, values=None):
+    def create_index(self, columns, unique=False, name=None):
+        r"""
+        Create an index on one or more columns of the table, so that
+        selecting rows by the values of those columns does not need to
+        scan the whole table.
+
+        Parameters
+        ----------
+        columns : string or list of strings
+            The column or columns to index.
+        unique : bool (optional)
+            Create a ``UNIQUE`` index.
+        name : string (optional)
+            Name of the index. If None, it is named after the table and
+            the columns, e.g. ``idx_People_name_age``.
+
+        Returns
+        -------
+        name : string
+            Name of the created index.
+
+        """
+
+        if isinstance(columns, string_types):
+            columns = [columns]
+        else:
+            columns = list(columns)
+        for col in columns:
+            if col not in self.columns:
+                raise ValueError("no such column: %s" % col)
+
+        if name is None:
+            name = "idx_%s_%s" % (self.name, "_".join(columns))
+
+        cmd = "CREATE %sINDEX %s ON %s(%s)" % (
+            "UNIQUE " if unique else "", name, self.name, ", ".join(columns))
+        sql_execute(self.db, cmd, verbose=self.verbose)
+
+        return name
+
+    def drop_index(self, name):
+        r"""
+        Drop the index called `name`.
+
+        Parameters
+        ----------
+        name : string
+            Name of the index (see :meth:`~dbtools.Table.list_indexes`).
+
+        """
+
+        cmd = "DROP INDEX %s" % name
+        sql_execute(self.db, cmd, verbose=self.verbose)
+
+    def list_indexes(self):
+        r"""
+        Get the indexes on the table.
+
+        Returns
+        -------
+        indexes : dict
+            Maps the name of each index to the tuple of columns it
+            indexes. This includes indexes that SQLite creates
+            automatically for ``UNIQUE`` columns.
+
+        """
+
+        cmd = "PRAGMA index_list(%s)" % self.name
+        rows = sql_execute(self.db, cmd, fetchall=True, verbose=self.verbose)
+
+        # each row has the form (seq, name, unique, ...)
+        indexes = {}
+        for row in rows:
+            cmd = "PRAGMA index_info(%s)" % row[1]
+            info = sql_execute(
+                self.db, cmd, fetchall=True, verbose=self.verbose)
+            # each row has the form (seqno, cid, name)
+            indexes[row[1]] = tuple([x[2] for x in sorted(info)])
+
+        return indexes
+
+    def suggest_indexes(self):
+        r"""
+        Suggest indexes for the ``WHERE`` clauses that have been used to
+        query the table.
+
+        This requires the table to have been created with
+        ``advise=True``. Each recorded clause is checked with ``EXPLAIN
+        QUERY PLAN``, and if SQLite would need to scan the whole table
+        to evaluate it, the table columns that it refers to are
+        suggested as an index (see :meth:`~dbtools.Table.create_index`).
+
+        Returns
+        -------
+        suggestions : pandas.DataFrame
+            One row for each ``WHERE`` clause that requires a scan, with
+            the number of times it was used and the suggested index
+            columns, sorted from most to least used.
+
+        """
+
+        if self._where_log is None:
+            raise ValueError("index advisor is not enabled, "
+                             "use Table(..., advise=True)")
+
+        suggestions = []
+        for where_str, (count, where_args) in self._where_log.items():
+            cmd = ["EXPLAIN QUERY PLAN SELECT * FROM %s WHERE %s" % (
+                self.name, where_str)]
+            if len(where_args) > 0:
+                cmd.append(where_args)
+            plan = sql_execute(
+                self.db, cmd, fetchall=True, verbose=self.verbose)
+
+            # the last element of each row describes a step of the plan,
+            # e.g. 'SCAN People' or 'SEARCH People USING INDEX ...'
+            scans = [row[-1] for row in plan if row[-1].startswith("SCAN")]
+            if len(scans) == 0:
+                continue
+
+            # find the table columns that the clause refers to, ignoring
+            # string literals
+            names = re.findall(
+                r"[A-Za-z_][A-Za-z0-9_]*", re.sub(r"'[^']*'", "", where_str))
+            columns = []
+            for col in names:
+                if col in self.columns and col not in columns:
+                    columns.append(col)
+            if len(columns) == 0:
+                continue
+
+            suggestions.append((where_str, count, tuple(columns)))
+
+        suggestions = pd.DataFrame(
+            suggestions, columns=['where', 'count', 'columns'])
+        suggestions = suggestions.sort_values(
+            'count', ascending=False, kind='mergesort').reset_index(drop=True)
+
+        return suggestions
+
+    def insert(self, values=None, chunksize=None):
         r"""
         Insert values into the table.
 
@@ -377,8 +902,59 @@ class Table(object):
         value should be excluded from every sequence as it will be
         filled in automatically.
 
+        Alternatively, `values` may hold columns rather than rows: a
+        dictionary mapping column names to arrays or lists of equal
+        length, a numpy structured array, or a DataFrame (whose index is
+        included as a column if it is named). Columns that are not given
+        are set to NULL.
+
+        All of the values are inserted with a single prepared statement
+        in one transaction, so if any of them is invalid, none of them
+        are inserted.
+
+        Parameters
+        ----------
+        values : list (optional)
+            The values to insert (see above).
+        chunksize : int (optional)
+            Number of rows to send to the database at a time. If None,
+            all rows are sent at once.
+
+        Returns
+        -------
+        count : int
+            The number of rows that were inserted.
+
         """
 
+        # perform the insertion
+        cols, rows = self._entries(values)
+        return self._insert_rows(cols, rows, chunksize=chunksize)
+
+    def _entries(self, values):
+        r"""
+        Helper function to parse the `values` given to
+        :meth:`~dbtools.Table.insert`.
+
+        Returns
+        -------
+        out : tuple
+            2-tuple of (list of column names, iterator of row tuples)
+
+        """
+
+        # columns of values are zipped into rows as they are inserted
+        if isinstance(values, pd.DataFrame) or is_columnar(values):
+            if isinstance(values, pd.DataFrame):
+                dtypes, columns = frame_to_columns(values)
+            else:
+                dtypes, columns = arrays_to_columns(values)
+            cols = [label for label, dtype in dtypes]
+            for col in cols:
+                if col not in self.columns:
+                    raise ValueError("no such column: %s" % col)
+            return cols, zip(*columns)
+
         # argument parsing -- `values` should be a list of sequences
         if values is None:
             values = {}
@@ -398,34 +974,188 @@ class Table(object):
             cols.remove(self.primary_key)
         ncol = len(cols)
 
-        # extract the entries from the values that were given
-        entries = []
-        for vals in values:
-            if hasattr(vals, 'keys'):
-                entry = tuple([vals.get(key, None) for key in cols])
-            elif hasattr(vals, "__iter__"):
-                if len(vals) != ncol:
-                    raise ValueError("expected %d values, got %d" % (
-                        ncol, len(vals)))
-                entry = tuple(vals)
-            else:
-                raise ValueError(
-                    "expected dict or list/tuple, got: %s" % type(vals))
+        # extract the entries from the values that were given -- this
+        # is a generator, so that the entries are only built as they
+        # are sent to the database
+        def entries():
+            for vals in values:
+                if hasattr(vals, 'keys'):
+                    entry = tuple([vals.get(key, None) for key in cols])
+                elif hasattr(vals, "__iter__"):
+                    if len(vals) != ncol:
+                        raise ValueError("expected %d values, got %d" % (
+                            ncol, len(vals)))
+                    entry = tuple(vals)
+                else:
+                    raise ValueError(
+                        "expected dict or list/tuple, got: %s" % type(vals))
+
+                yield entry
+
+        return cols, entries()
+
+    def _insert_rows(self, cols, rows, chunksize=None):
+        r"""
+        Helper function to insert rows of values into the columns
+        `cols` with a single prepared statement.
+
+        Parameters
+        ----------
+        cols : list of strings
+            The names of the columns to insert values into.
+        rows : iterable of sequences
+            The rows to insert. Each row should have one value for each
+            column in `cols`.
+        chunksize : int (optional)
+            See :meth:`~dbtools.Table.insert`
 
-            entries.append(entry)
+        Returns
+        -------
+        count : int
+            The number of rows that were inserted.
 
-        # target string of NULL and question marks
-        qm = ["?"]*ncol
-        qm = ", ".join(qm)
-        c = ", ".join(cols)
+        """
 
         # perform the insertion
-        for entry in entries:
-            cmd = ("INSERT INTO %s(%s) VALUES (%s)" % (
-                self.name, c, qm), entry)
-            sql_execute(self.db, cmd, verbose=self.verbose)
+        cmd = self._statement("INSERT", cols)
+        count = sql_executemany(
+            self.db, cmd, rows, chunksize=chunksize, verbose=self.verbose)
+
+        return count
+
+    def writer(self, flush_rows=1000, flush_interval=1.0):
+        r"""
+        Get a writer that buffers inserted rows in memory and writes
+        them to the table in batches from a background thread, e.g.::
+
+            with tbl.writer(flush_rows=1000, flush_interval=1.0) as w:
+                w.insert(["Alyssa P. Hacker", 25, 66.24])
+
+        See :class:`dbtools.writer.TableWriter`.
+
+        Parameters
+        ----------
+        flush_rows : int (default=1000)
+            Number of buffered rows at which the buffer is written.
+        flush_interval : float (default=1.0)
+            Maximum time, in seconds, that rows are kept in the buffer.
+
+        Returns
+        -------
+        writer : :class:`dbtools.writer.TableWriter`
+
+        """
+
+        return TableWriter(
+            self, flush_rows=flush_rows, flush_interval=flush_interval)
+
+    def upsert(self, values, chunksize=None):
+        r"""
+        Insert rows into the table, or update them if a row with the
+        same primary key already exists.
+
+        The `values` parameter should be a dictionary, a list of
+        dictionaries, or a pandas DataFrame:
+
+            * Dictionary keys should correspond to column names, and
+              must include the primary key. Only the columns that are
+              given are updated in existing rows.
+
+            * The index of a DataFrame should hold the primary key, and
+              its columns should correspond to column names.
+
+        All rows are written with ``INSERT ... ON CONFLICT DO UPDATE``
+        statements in a single transaction, which requires SQLite 3.24
+        or later.
+
+        Parameters
+        ----------
+        values : dict, list of dicts, or pandas.DataFrame
+            The rows to insert or update (see above).
+        chunksize : int (optional)
+            See :meth:`~dbtools.Table.insert`
+
+        Returns
+        -------
+        count : int
+            The number of rows that were inserted or updated.
+
+        """
+
+        require_sqlite((3, 24, 0), "upsert")
+        if self.primary_key is None:
+            raise ValueError("cannot upsert into a table without a primary key")
+
+        runs = self._runs(values)
+        count = 0
+        with self.transaction():
+            for cols, rows in runs:
+                count += self._upsert_rows(cols, rows, chunksize=chunksize)
+
+        return count
+
+    def _runs(self, values):
+        r"""
+        Helper function to split a dictionary, list of dictionaries, or
+        DataFrame into runs of rows that have the same columns.
+
+        Returns
+        -------
+        runs : list of 2-tuples
+            Each tuple in the list has the form (column names, rows),
+            where the rows are sequences of values for those columns.
+
+        """
+
+        if isinstance(values, pd.DataFrame):
+            dtypes, columns = frame_to_columns(values)
+            cols = [label for label, dtype in dtypes]
+            return [(cols, zip(*columns))]
 
-    def select(self, columns=None, where=None):
+        if hasattr(values, 'keys'):
+            values = [values]
+        runs = []
+        for vals in values:
+            if not hasattr(vals, 'keys'):
+                raise ValueError("expected dict, got: %s" % type(vals))
+            cols = sorted(vals.keys())
+            if len(runs) == 0 or runs[-1][0] != cols:
+                runs.append((cols, []))
+            runs[-1][1].append(tuple([vals[key] for key in cols]))
+
+        return runs
+
+    def _upsert_rows(self, cols, rows, chunksize=None):
+        r"""
+        Helper function to insert or update rows of values in the
+        columns `cols`, which must include the primary key (see
+        :meth:`~dbtools.Table._insert_rows`).
+
+        """
+
+        if self.primary_key not in cols:
+            raise ValueError("missing primary key: %s" % self.primary_key)
+        for col in cols:
+            if col not in self.columns:
+                raise ValueError("no such column: %s" % col)
+
+        # update every given column except the primary key
+        updates = ["%s=excluded.%s" % (col, col)
+                   for col in cols if col != self.primary_key]
+        if len(updates) > 0:
+            action = "DO UPDATE SET %s" % ", ".join(updates)
+        else:
+            action = "DO NOTHING"
+
+        qm = ", ".join(["?"]*len(cols))
+        cmd = "INSERT INTO %s(%s) VALUES (%s) ON CONFLICT(%s) %s" % (
+            self.name, ", ".join(cols), qm, self.primary_key, action)
+        count = sql_executemany(
+            self.db, cmd, rows, chunksize=chunksize, verbose=self.verbose)
+
+        return count
+
+    def select(self, columns=None, where=None, chunksize=None):
         r"""
         Select data from the table.
 
@@ -448,15 +1178,188 @@ class Table(object):
                 where=("age=?", 25)
                 where=("age=? OR name=?", (25, "Ben Bitdiddle"))
 
+        chunksize : int (default=None)
+            If given, return an iterator of DataFrames with at most
+            `chunksize` rows each, rather than a single DataFrame. Rows
+            are fetched from the database as the iterator is consumed,
+            so the whole result never has to fit in memory, e.g.::
+
+                for chunk in tbl.select(chunksize=10000):
+                    total += chunk['age'].sum()
+
+            While the iterator is open, it holds a connection with an
+            open read. With the default rollback journal, that blocks
+            writes from every other connection, including the ones the
+            same thread uses for `insert`, `update` and so on: they fail
+            with "database is locked" once the busy timeout runs out. To
+            write while reading in chunks, either open the table with
+            ``profile='performance'`` (WAL mode, where readers do not
+            block writers), or run the loop inside
+            :meth:`~dbtools.Table.transaction`, which shares one
+            connection between the read and the writes (rows written
+            to the table being read may then show up in later chunks).
+
         Returns
         -------
-        data : pandas.DataFrame
+        data : pandas.DataFrame or iterator of pandas.DataFrame
             A pandas DataFrame containing the queried data. Column names
             correspond to the table column names, and if there is a
             primary key column, it will be used as the index.
 
         """
 
+        cols, cmd = self._select_cmd(columns, where)
+
+        if chunksize is not None:
+            if chunksize < 1:
+                raise ValueError("invalid chunk size: %s" % chunksize)
+            return self._iter_select(cols, cmd, chunksize)
+
+        # look up the result in the cache -- but not during a
+        # transaction, as it may have uncommitted changes
+        key = None
+        if self._cache and not in_transaction(self.db):
+            args = tuple(cmd[1]) if len(cmd) > 1 else ()
+            key = (tuple(cols), cmd[0], args)
+            try:
+                hash(key)
+            except TypeError:
+                key = None
+        if key is not None:
+            cache = get_query_cache(self.db)
+            data, version = cache.get(key)
+            if data is not None:
+                return data
+
+        # connect to the database and execute the query
+        rows = sql_execute(self.db, cmd, fetchall=True, verbose=self.verbose)
+        data = self._frame(rows, cols)
+
+        if key is not None:
+            cache.put(key, data, version)
+
+        return data
+
+    def select_parallel(self, columns=None, where=None, n_workers=None):
+        r"""
+        Select data from the table, reading it in several processes at
+        once. This is faster than :meth:`~dbtools.Table.select` for scans
+        of large tables, as both the query and the building of the
+        DataFrame are spread over several cores.
+
+        The table is split into `n_workers` ranges of the ``INTEGER
+        PRIMARY KEY`` (or of the ``rowid``, if there is none), and each
+        range is read in its own process with its own read-only
+        connection. Since the workers use separate connections, they do
+        not see changes made in an uncommitted transaction.
+
+        Parameters
+        ----------
+        columns : (default=None)
+            See :meth:`~dbtools.Table.select`.
+        where : (default=None)
+            See :meth:`~dbtools.Table.select`.
+        n_workers : int (default=None)
+            Number of worker processes. Defaults to the number of CPUs.
+
+        Returns
+        -------
+        data : pandas.DataFrame
+            The same DataFrame as returned by
+            :meth:`~dbtools.Table.select`, in order of the partitioning
+            key.
+
+        """
+
+        if n_workers is None:
+            n_workers = multiprocessing.cpu_count()
+        if n_workers < 1:
+            raise ValueError("invalid number of workers: %s" % n_workers)
+        path = db_path(self.db)
+        if path == ":memory:":
+            raise ValueError("cannot read an in-memory database in parallel")
+
+        # partition on the INTEGER PRIMARY KEY, which is an alias for
+        # the rowid, or else on the rowid itself -- other integer
+        # primary keys may hold NULL or REAL values, which the ranges
+        # below would miss
+        key = self._rowid_alias() or "rowid"
+        cmd = "SELECT MIN(%s), MAX(%s) FROM %s" % (key, key, self.name)
+        lo, hi = sql_execute(self.db, cmd, fetchall=True, verbose=self.verbose)[0]
+        if lo is None or n_workers == 1:
+            return self.select(columns=columns, where=where)
+
+        # build one command per range of the key
+        cols, cmd = self._select_cmd(columns, None)
+        where_str, where_args = self._where(where)
+        cond = "%s>=? AND %s<?" % (key, key)
+        if where_str:
+            cond = "(%s) AND %s" % (where_str[len(" WHERE "):], cond)
+        query = "%s WHERE %s" % (cmd[0], cond)
+        args = list(where_args)
+        step = (hi - lo) // n_workers + 1
+        uri = readonly_uri(path)
+        affinities = [self._affinities.get(col, "NUMERIC") for col in cols]
+        index = self.primary_key if self.primary_key in cols else None
+        tasks = []
+        for start in range(lo, hi + 1, step):
+            task_cmd = [query, args + [start, start + step]]
+            tasks.append((uri, task_cmd, cols, affinities, index))
+            if self.verbose:
+                print(task_cmd)
+
+        # read the ranges, and put them back together in order
+        pool = multiprocessing.Pool(min(n_workers, len(tasks)))
+        try:
+            frames = pool.map(_select_partition, tasks)
+        finally:
+            pool.close()
+            pool.join()
+        data = pd.concat(frames)
+        if index is None:
+            data = data.reset_index(drop=True)
+
+        return data
+
+    def _rowid_alias(self):
+        r"""
+        Helper function to get the name of the column that is an alias
+        for the ``rowid``: a single primary key column whose declared
+        type is exactly ``INTEGER``. Unlike other integer primary keys,
+        its values are never NULL or REAL.
+
+        Returns
+        -------
+        name : string or None
+            The name of the column, or None if there is no such column.
+
+        """
+
+        if self.primary_key is None:
+            return None
+        col = self.column_info[self.columns.index(self.primary_key)]
+        if col.type.upper() != "INTEGER":
+            return None
+        return col.name
+
+    def _select_cmd(self, columns, where):
+        r"""
+        Helper function to build a ``SELECT`` command.
+
+        Parameters
+        ----------
+        columns : string or list of strings
+            See :meth:`~dbtools.Table.select`
+        where : string or tuple
+            See :meth:`~dbtools.Table.select`
+
+        Returns
+        -------
+        out : tuple
+            2-tuple of (list of selected column names, command)
+
+        """
+
         # argument parsing
         if columns is None:
             cols = list(self.columns)
@@ -470,30 +1373,254 @@ class Table(object):
         # correct index later
         if self.primary_key is not None and self.primary_key not in cols:
             cols.insert(0, self.primary_key)
-        sel = ",".join(cols)
 
         # base query
-        query = "SELECT %s FROM %s" % (sel, self.name)
         where_str, where_args = self._where(where)
-        query += where_str
-        cmd = [query]
+        cmd = [self._statement("SELECT", cols, where_str)]
         if len(where_args) > 0:
             cmd.append(where_args)
 
-        # connect to the database and execute the query
-        rows = sql_execute(self.db, cmd, fetchall=True, verbose=self.verbose)
+        return cols, cmd
+
+    def _iter_select(self, cols, cmd, chunksize):
+        r"""
+        Helper function to run the ``SELECT`` command `cmd` and yield
+        the result as DataFrames of at most `chunksize` rows.
+
+        """
+
+        chunks = sql_iterate(
+            self.db, cmd, chunksize, verbose=self.verbose)
+        for rows in chunks:
+            yield self._frame(rows, cols)
+
+    def _frame(self, rows, cols):
+        r"""
+        Helper function to parse rows of selected data into a
+        DataFrame, using the primary key (if selected) as the index.
+
+        """
 
         # now we need to parse the result into a DataFrame
         if self.primary_key in cols:
             index = self.primary_key
         else:
             index = None
-        data = pd.DataFrame.from_records(
-            rows, columns=cols, index=index,
-            coerce_float=True)
+        affinities = [self._affinities.get(col, "NUMERIC") for col in cols]
+        data = rows_to_frame(rows, cols, affinities, index=index)
 
         return data
 
+    def count(self, where=None):
+        r"""
+        Count the rows in the table, without reading them. ``len(tbl)``
+        is the same as ``tbl.count()``.
+
+        Parameters
+        ----------
+        where : (default=None)
+            See :meth:`~dbtools.Table.select`.
+
+        Returns
+        -------
+        count : int
+            The number of rows that match `where`.
+
+        """
+
+        where_str, where_args = self._where(where)
+        cmd = ["SELECT COUNT(*) FROM %s%s" % (self.name, where_str)]
+        if len(where_args) > 0:
+            cmd.append(where_args)
+
+        return sql_execute(self.db, cmd, fetchall=True, verbose=self.verbose)[0][0]
+
+    def aggregate(self, funcs, by=None, where=None):
+        r"""
+        Compute aggregates of columns in the database, without reading
+        the rows, e.g.::
+
+            tbl.aggregate({'age': 'mean', 'height': ['min', 'max']},
+                          by='name', where="age>20")
+
+        The available functions are 'count' (of the non-NULL values),
+        'sum', 'mean', 'min' and 'max'.
+
+        Parameters
+        ----------
+        funcs : dict
+            Maps column names to a function name, or to a list of
+            function names.
+        by : string or list of strings (default=None)
+            Column(s) to group the rows by. If None, the whole table (or
+            the rows matching `where`) are aggregated.
+        where : (default=None)
+            See :meth:`~dbtools.Table.select`.
+
+        Returns
+        -------
+        data : pandas.DataFrame
+            A DataFrame with one row for each group, indexed by the `by`
+            columns, or with a single row if `by` is None. A column that
+            is given one function is named after the column, and one
+            that is given a list of functions (or is also a `by` column)
+            has a column for each, named like 'height_min'.
+
+        """
+
+        if not hasattr(funcs, 'keys'):
+            raise ValueError("expected a dictionary, got %s" % type(funcs))
+        if by is None:
+            by = []
+        elif isinstance(by, string_types):
+            by = [by]
+        else:
+            by = list(by)
+        for col in by:
+            if col not in self.columns:
+                raise ValueError("no such column: %s" % col)
+
+        # build the selected expressions, along with the names and type
+        # affinities of the result columns
+        exprs = list(by)
+        names = list(by)
+        affinities = [self._affinities[col] for col in by]
+        for col in sorted(funcs.keys()):
+            if col not in self.columns:
+                raise ValueError("no such column: %s" % col)
+            if isinstance(funcs[col], string_types):
+                # don't overwrite the group column of the same name
+                if col in by:
+                    fs = [(funcs[col], "%s_%s" % (col, funcs[col]))]
+                else:
+                    fs = [(funcs[col], col)]
+            else:
+                fs = [(f, "%s_%s" % (col, f)) for f in funcs[col]]
+            for f, name in fs:
+                if f not in _AGGREGATES:
+                    raise ValueError("invalid aggregate function: %s" % f)
+                if name in names:
+                    raise ValueError("duplicate output column: %s" % name)
+                exprs.append("%s(%s)" % (_AGGREGATES[f], col))
+                names.append(name)
+                if f == 'count':
+                    affinities.append("INTEGER")
+                elif f == 'mean':
+                    affinities.append("REAL")
+                else:
+                    affinities.append(self._affinities[col])
+        if len(exprs) == len(by):
+            raise ValueError("no aggregate functions given")
+
+        where_str, where_args = self._where(where)
+        query = "SELECT %s FROM %s%s" % (
+            ", ".join(exprs), self.name, where_str)
+        if len(by) > 0:
+            query += " GROUP BY %s ORDER BY %s" % (
+                ", ".join(by), ", ".join(by))
+        cmd = [query]
+        if len(where_args) > 0:
+            cmd.append(where_args)
+
+        rows = sql_execute(self.db, cmd, fetchall=True, verbose=self.verbose)
+        data = rows_to_frame(rows, names, affinities)
+        if len(by) > 0:
+            data = data.set_index(by)
+
+        return data
+
+    def pages(self, order_by, page_size, where=None, columns=None,
+              descending=False, cursor=None):
+        r"""
+        Page through the table in the order of the column(s)
+        `order_by`, e.g.::
+
+            pages = tbl.pages('age', 50, where=("height>?", 60))
+            first = next(pages)
+            token = pages.cursor
+
+            # later on, continue from where the first page ended
+            pages = tbl.pages('age', 50, where=("height>?", 60),
+                              cursor=token)
+            second = next(pages)
+
+        Each page is fetched with its own query, which seeks past the
+        last row of the previous page using the values of its sort
+        columns (keyset pagination), so pages are equally fast however
+        deep into the table they are. Indexing the sort columns (see
+        :meth:`~dbtools.Table.create_index`) makes them faster still.
+        The seek uses row values, which require SQLite 3.15 or later.
+
+        The primary key (or the ``rowid``, if there is none) is added
+        to the sort columns to break ties, so that no row is skipped or
+        repeated. As in SQLite, NULL sort values come first in ascending
+        order and last in descending order. Seeking is simplest (and
+        makes the best use of indexes) on columns that cannot hold NULL,
+        i.e. ``NOT NULL`` columns and an ``INTEGER PRIMARY KEY``.
+
+        Parameters
+        ----------
+        order_by : string or list of strings
+            The column(s) to sort by.
+        page_size : int
+            The number of rows in each page.
+        where : (default=None)
+            See :meth:`~dbtools.Table.select`.
+        columns : (default=None)
+            See :meth:`~dbtools.Table.select`.
+        descending : bool (default=False)
+            Sort in descending rather than ascending order.
+        cursor : string (default=None)
+            A token from the `cursor` attribute of a previous iterator,
+            to start from the row after the one it points to.
+
+        Returns
+        -------
+        pages : :class:`dbtools.table.Pages`
+            An iterator of DataFrames with at most `page_size` rows
+            each, as returned by :meth:`~dbtools.Table.select`. Its
+            `cursor` attribute holds a token for the last row of the
+            most recent page.
+
+        """
+
+        require_sqlite((3, 15, 0), "paging")
+        if page_size < 1:
+            raise ValueError("invalid page size: %s" % page_size)
+        if isinstance(order_by, string_types):
+            keys = [order_by]
+        else:
+            keys = list(order_by)
+        for key in keys:
+            if key not in self.columns:
+                raise ValueError("no such column: %s" % key)
+        if self.primary_key is not None:
+            tiebreak = self.primary_key
+        else:
+            tiebreak = "rowid"
+        if tiebreak not in keys:
+            keys.append(tiebreak)
+
+        # select the sort columns too, so that the cursor can be taken
+        # from the last row
+        cols = self._select_cmd(columns, None)[0]
+        extra = [key for key in keys if key not in cols]
+        query = "SELECT %s FROM %s" % (",".join(cols + extra), self.name)
+        where_str, where_args = self._where(where)
+        cond = where_str[len(" WHERE "):] if where_str else None
+
+        # find the sort columns that may hold NULL, which need a more
+        # careful seek (the rowid and its alias never do, but the
+        # columns of a composite primary key can)
+        notnull = set(["rowid", self._rowid_alias()])
+        for col in self.column_info:
+            if col.notnull:
+                notnull.add(col.name)
+        nullable = [key not in notnull for key in keys]
+
+        return Pages(self, cols, extra, keys, nullable, query, cond,
+                     list(where_args), page_size, descending, cursor)
+
     def __getitem__(self, key):
         r"""
         Select data from the table.
@@ -594,22 +1721,83 @@ class Table(object):
         if not hasattr(values, 'keys'):
             raise ValueError("expected a dictionary, got %s" % type(values))
 
-        # base update
-        update = "UPDATE %s SET " % self.name
-        update += ", ".join(["%s=?" % key for key in sorted(values.keys())])
-        args = [values[key] for key in sorted(values.keys())]
-
-        # filter with WHERE
+        # base update, filtered with WHERE
+        cols = sorted(values.keys())
+        args = [values[key] for key in cols]
         where_str, where_args = self._where(where)
-        update += where_str
         args.extend(where_args)
-        cmd = [update]
+        cmd = [self._statement("UPDATE", cols, where_str)]
         if len(args) > 0:
             cmd.append(args)
 
         # connect to the database and execute the update
         sql_execute(self.db, cmd, verbose=self.verbose)
 
+    def update_many(self, values, key=None, chunksize=None):
+        r"""
+        Update many rows in the table, each with its own values.
+
+        The `values` parameter should be a dictionary, a list of
+        dictionaries, or a pandas DataFrame. Each dictionary (or row of
+        the DataFrame) holds the new values of one row, along with the
+        value of the `key` column that identifies which row to update.
+        Only the columns that are given are updated. For a DataFrame,
+        the key may also be its (named) index, e.g.::
+
+            data = tbl.select()
+            data['bmi'] = data['weight'] / data['height'] ** 2
+            tbl.update_many(data[['bmi']])
+
+        All rows are updated with one prepared ``UPDATE`` statement in a
+        single transaction.
+
+        Parameters
+        ----------
+        values : dict, list of dicts, or pandas.DataFrame
+            The new values (see above).
+        key : string (optional)
+            Name of the column that identifies the rows. If None, the
+            primary key is used.
+        chunksize : int (optional)
+            See :meth:`~dbtools.Table.insert`
+
+        Returns
+        -------
+        count : int
+            The number of rows that were updated.
+
+        """
+
+        if key is None:
+            key = self.primary_key
+        if key is None:
+            raise ValueError("no primary key, so `key` must be given")
+
+        runs = self._runs(values)
+        count = 0
+        with self.transaction():
+            for cols, rows in runs:
+                if key not in cols:
+                    raise ValueError("missing key column: %s" % key)
+                for col in cols:
+                    if col not in self.columns:
+                        raise ValueError("no such column: %s" % col)
+
+                # use numbered placeholders, so that the rows can be
+                # passed as they are, with the key in any position
+                sets = ["%s=?%d" % (col, i + 1)
+                        for i, col in enumerate(cols) if col != key]
+                if len(sets) == 0:
+                    continue
+
+                cmd = "UPDATE %s SET %s WHERE %s=?%d" % (
+                    self.name, ", ".join(sets), key, cols.index(key) + 1)
+                count += sql_executemany(
+                    self.db, cmd, rows, chunksize=chunksize,
+                    verbose=self.verbose)
+
+        return count
+
     def delete(self, where=None):
         r"""
         Delete rows from the table.
@@ -632,45 +1820,475 @@ class Table(object):
 
         """
 
-        # base update
-        delete = "DELETE FROM %s" % self.name
-
-        # filter with WHERE
+        # base delete, filtered with WHERE
         where_str, where_args = self._where(where)
-        delete += where_str
-        cmd = [delete]
+        cmd = [self._statement("DELETE", (), where_str)]
         if len(where_args) > 0:
             cmd.append(where_args)
 
         # connect to the database and execute the update
         sql_execute(self.db, cmd, verbose=self.verbose)
 
-    def save_csv(self, path, columns=None, where=None):
+    def save_csv(self, path, columns=None, where=None, chunksize=10000,
+                 compression=None, progress=None):
         r"""
         Write table data to a CSV text file.
 
         Takes in a `path` for the file as well as any arguments and/or
         keyword arguments to be passed to
-        :meth:`~dbtools.Table.select`. The output of
-        :meth:`~dbtools.Table.select` with those arguments is what
-        will be written to the csv file.
+        :meth:`~dbtools.Table.select`. The data selected with those
+        arguments is what will be written to the csv file, starting with
+        the primary key column (if there is one).
+
+        The rows are streamed from the database to the file in chunks,
+        so the table does not need to fit in memory. The read is held
+        open until the file is written, which blocks writes to the
+        database in the meantime (see the `chunksize` parameter of
+        :meth:`~dbtools.Table.select`).
+
+        Parameters
+        ----------
+        path : string or file
+            Path to save the csv file, or an open file.
+        columns : (optional)
+            See `select`
+        where : (optional)
+            See `select`
+        chunksize : int (optional)
+            Number of rows to fetch from the database at a time.
+        compression : string (optional)
+            Either 'gzip' or None. If None, the file is gzipped if
+            `path` ends in '.gz'.
+        progress : function (optional)
+            Function that is called with the number of rows written so
+            far, after each chunk is written.
+
+        Returns
+        -------
+        count : int
+            The number of rows that were written.
+
+        """
+
+        if chunksize < 1:
+            raise ValueError("invalid chunk size: %s" % chunksize)
+        cols, cmd = self._select_cmd(columns, where)
+
+        if hasattr(path, 'write'):
+            f = path
+        else:
+            f = open_text(path, 'w', compression=compression)
+
+        count = 0
+        try:
+            writer = csv.writer(f)
+            writer.writerow(cols)
+            chunks = sql_iterate(
+                self.db, cmd, chunksize, verbose=self.verbose)
+            for rows in chunks:
+                writer.writerows(rows)
+                count += len(rows)
+                if progress is not None:
+                    progress(count)
+        finally:
+            if f is not path:
+                f.close()
+
+        return count
+
+    def iter_batches(self, columns=None, where=None, chunksize=65536):
+        r"""
+        Select data from the table as Arrow RecordBatches.
+
+        The rows are fetched from the database as the iterator is
+        consumed. The type of each column is inferred from the types of
+        all of its selected values, which are found with a single
+        aggregate query before the first batch (see
+        :func:`dbtools.util.arrow_schema`), and every batch has the same
+        schema. As with a chunked :meth:`~dbtools.Table.select`, writes
+        to the database are blocked while the iterator is open, unless
+        it is in WAL mode or the writes share a transaction with the
+        read. Requires pyarrow.
+
+        Parameters
+        ----------
+        columns : (optional)
+            See `select`
+        where : (optional)
+            See `select`
+        chunksize : int (optional)
+            Maximum number of rows in each batch.
+
+        Returns
+        -------
+        batches : iterator of pyarrow.RecordBatch
+            The selected data, including the primary key column (if
+            there is one).
+
+        """
+
+        require_pyarrow()
+        cols, cmd = self._select_cmd(columns, where)
+        return self._iter_batches(cols, cmd, where, chunksize)
+
+    def _arrow_schema(self, cols, where):
+        r"""
+        Helper function to get the Arrow schema of the columns `cols`
+        for the rows matching `where`, from the storage classes of the
+        values that they hold.
+
+        """
+
+        where_str, where_args = self._where(where)
+        cmd = ["SELECT %s FROM %s%s" % (
+            ",".join(["group_concat(DISTINCT typeof(%s))" % col
+                      for col in cols]),
+            self.name, where_str)]
+        if len(where_args) > 0:
+            cmd.append(where_args)
+        found = sql_execute(
+            self.db, cmd, fetchall=True, verbose=self.verbose)[0]
+        types = [set() if x is None else set(x.split(",")) for x in found]
+        affinities = [self._affinities.get(col, "NUMERIC") for col in cols]
+        return arrow_schema(cols, affinities, types=types)
+
+    def _iter_batches(self, cols, cmd, where, chunksize):
+        r"""
+        Helper function to run the ``SELECT`` command `cmd` and yield
+        the result as RecordBatches of at most `chunksize` rows.
+
+        """
+
+        schema = self._arrow_schema(cols, where)
+        chunks = sql_iterate(
+            self.db, cmd, chunksize, verbose=self.verbose)
+        for rows in chunks:
+            yield rows_to_batch(rows, schema)
+
+    def to_parquet(self, path, columns=None, where=None, chunksize=65536,
+                   compression='snappy'):
+        r"""
+        Write table data to a Parquet file.
+
+        The rows are streamed from the database to the file, and each
+        chunk of `chunksize` rows is written as its own row group, so
+        the table does not need to fit in memory. The column types are
+        the same as for :meth:`~dbtools.Table.iter_batches`, and so is
+        the read that is held open (and blocks writes) during the
+        export. If the export fails, the partly written file is removed.
+        Requires pyarrow.
 
         Parameters
         ----------
         path : string
-            Path to save the csv file.
+            Path to save the Parquet file.
         columns : (optional)
             See `select`
         where : (optional)
             See `select`
+        chunksize : int (optional)
+            Number of rows to fetch from the database at a time.
+        compression : string (optional)
+            Compression codec, e.g. 'snappy', 'gzip' or None.
+
+        Returns
+        -------
+        count : int
+            The number of rows that were written.
 
         """
 
-        table = self.select(columns=columns, where=where)
-        table.to_csv(path)
+        require_pyarrow()
+        cols, cmd = self._select_cmd(columns, where)
+
+        schema = self._arrow_schema(cols, where)
+        writer = pq.ParquetWriter(path, schema, compression=compression)
+        count = 0
+        try:
+            chunks = sql_iterate(
+                self.db, cmd, chunksize, verbose=self.verbose)
+            for rows in chunks:
+                batch = rows_to_batch(rows, schema)
+                writer.write_table(pa.Table.from_batches([batch]))
+                count += batch.num_rows
+        except BaseException:
+            writer.close()
+            os.remove(path)
+            raise
+        writer.close()
+
+        return count
+
+    def load_csv(self, path, chunksize=10000, compression=None,
+                 synchronous=None, journal_mode=None, progress=None):
+        r"""
+        Load the contents of a CSV text file into the table.
+
+        The first line of the file should hold the names of the columns
+        (which may be in any order, or only a subset of the table's
+        columns). Empty values are loaded as ``NULL``, and other values
+        are converted according to the type affinity of their column.
+
+        The file is streamed into the table in chunks of `chunksize`
+        rows within a single transaction, so it does not need to fit in
+        memory. Durability can be traded for speed during the load with
+        the `synchronous` and `journal_mode` pragmas.
+
+        Parameters
+        ----------
+        path : string or file
+            Path to the csv file, or an open file.
+        chunksize : int (optional)
+            Number of rows to insert at a time.
+        compression : string (optional)
+            Either 'gzip' or None. If None, the file is assumed to be
+            gzipped if `path` ends in '.gz'.
+        synchronous : string (optional)
+            Value of ``PRAGMA synchronous`` during the load, e.g. 'OFF'.
+        journal_mode : string (optional)
+            Value of ``PRAGMA journal_mode`` during the load, e.g.
+            'MEMORY'.
+        progress : function (optional)
+            Function that is called with the number of rows loaded so
+            far, after each chunk is inserted.
+
+        Returns
+        -------
+        count : int
+            The number of rows that were loaded.
+
+        """
+
+        if hasattr(path, 'read'):
+            f = path
+        else:
+            f = open_text(path, 'r', compression=compression)
+
+        try:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if header is None:
+                raise ValueError("no header row in CSV file")
+            count = self._load_rows(
+                header, reader, chunksize=chunksize,
+                synchronous=synchronous, journal_mode=journal_mode,
+                progress=progress)
+        finally:
+            if f is not path:
+                f.close()
+
+        return count
+
+    def _load_rows(self, header, rows, chunksize=10000, synchronous=None,
+                   journal_mode=None, progress=None):
+        r"""
+        Helper function to insert rows of text values read from a CSV
+        file into the columns `header` (see
+        :meth:`~dbtools.Table.load_csv`).
+
+        """
+
+        if chunksize < 1:
+            raise ValueError("invalid chunk size: %s" % chunksize)
+        for col in header:
+            if col not in self.columns:
+                raise ValueError("no such column: %s" % col)
+
+        count = 0
+        pragmas = _load_pragmas(synchronous, journal_mode)
+        with transaction(self.db, pragmas=pragmas):
+            while True:
+                chunk = [tuple([x if x != "" else None for x in row])
+                         for row in itertools.islice(rows, chunksize)]
+                if len(chunk) == 0:
+                    break
+                count += self._insert_rows(header, chunk)
+                if progress is not None:
+                    progress(count)
+
+        return count
+
+    def __len__(self):
+        return self.count()
+
+    def __bool__(self):
+        # a table is true even if it is empty, and testing it shouldn't
+        # need a query
+        return True
 
     def __repr__(self):
         return self.repr
 
     def __str__(self):
         return self.repr
+
+
+class Pages(object):
+    r"""
+    Iterator of the pages of a table, as returned by
+    :meth:`dbtools.Table.pages`.
+
+    Attributes
+    ----------
+    cursor : string or None
+        A token for the last row that has been returned, which can be
+        passed to :meth:`dbtools.Table.pages` to continue from the next
+        row. None if no row has been returned yet.
+
+    """
+
+    def __init__(self, table, cols, extra, keys, nullable, query, cond,
+                 args, page_size, descending, cursor):
+        self.table = table
+        self.cursor = cursor
+        self._cols = cols
+        self._extra = extra
+        self._keys = keys
+        self._nullable = nullable
+        self._args = args
+        self._descending = descending
+        self._done = False
+        self._last = None
+        if cursor is not None:
+            self._last = self._decode(cursor)
+
+        # the command for the first page, and the commands that seek
+        # past the last row of the previous page (see `_seek`)
+        self._query = query
+        self._cond = cond
+        order = " DESC" if descending else ""
+        self._tail = " ORDER BY %s LIMIT %d" % (
+            ", ".join([key + order for key in keys]), page_size)
+        self._page_size = page_size
+        if cond is None:
+            self._first = "%s%s" % (query, self._tail)
+        else:
+            self._first = "%s WHERE (%s)%s" % (query, cond, self._tail)
+        self._seeks = {}
+
+    def _seek(self, last):
+        r"""
+        Get the command and arguments that select the page after the
+        row with the sort values `last`.
+
+        """
+
+        nulls = tuple([value is None for value in last])
+        if nulls not in self._seeks:
+            self._seeks[nulls] = self._seek_cmd(nulls)
+        cmd, index = self._seeks[nulls]
+        return [cmd, self._args + [last[i] for i in index]]
+
+    def _seek_cmd(self, nulls):
+        r"""
+        Helper function to build the command that seeks past a row,
+        given which of its sort values are NULL. Returns the command,
+        and the index of the sort value for each of its parameters.
+
+        """
+
+        keys = self._keys
+        if not any(self._nullable) or (
+                not self._descending and not any(nulls)):
+            # a row value comparison is NULL (so false) for the rows
+            # with NULL sort values, which here all come before the
+            # last row
+            seek = "(%s) %s (%s)" % (
+                ", ".join(keys), "<" if self._descending else ">",
+                ", ".join(["?"] * len(keys)))
+            index = list(range(len(keys)))
+
+        else:
+            # the rows that are equal to the last row on the first i
+            # sort columns, and come after it on the next one
+            terms = []
+            index = []
+            for i, key in enumerate(keys):
+                term = []
+                term_index = []
+                for j in range(i):
+                    if nulls[j]:
+                        term.append("%s IS NULL" % keys[j])
+                    else:
+                        term.append("%s=?" % keys[j])
+                        term_index.append(j)
+                if nulls[i]:
+                    # nothing comes after NULL in descending order
+                    if self._descending:
+                        continue
+                    term.append("%s IS NOT NULL" % key)
+                elif self._descending:
+                    if self._nullable[i]:
+                        term.append("(%s<? OR %s IS NULL)" % (key, key))
+                    else:
+                        term.append("%s<?" % key)
+                    term_index.append(i)
+                else:
+                    term.append("%s>?" % key)
+                    term_index.append(i)
+                terms.append("(%s)" % " AND ".join(term))
+                index.extend(term_index)
+            seek = "(%s)" % " OR ".join(terms)
+
+        if self._cond is None:
+            cmd = "%s WHERE %s%s" % (self._query, seek, self._tail)
+        else:
+            cmd = "%s WHERE (%s) AND %s%s" % (
+                self._query, self._cond, seek, self._tail)
+        return cmd, index
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._done:
+            raise StopIteration
+
+        if self._last is None:
+            cmd = [self._first]
+            if len(self._args) > 0:
+                cmd.append(self._args)
+        else:
+            cmd = self._seek(self._last)
+        tbl = self.table
+        rows = sql_execute(tbl.db, cmd, fetchall=True, verbose=tbl.verbose)
+        if len(rows) < self._page_size:
+            self._done = True
+        if len(rows) == 0:
+            raise StopIteration
+
+        # remember the sort values of the last row
+        names = self._cols + self._extra
+        last = tuple([rows[-1][names.index(key)] for key in self._keys])
+        self._last = last
+        self.cursor = self._encode(last)
+
+        data = tbl._frame(rows, names)
+        if len(self._extra) > 0:
+            data = data.drop(self._extra, axis=1)
+
+        return data
+
+    def _encode(self, values):
+        # blobs are not JSON values, so they are stored as base64 text
+        # in a single-element list
+        values = [
+            [base64.b64encode(value).decode('ascii')]
+            if isinstance(value, blob_type) else value
+            for value in values]
+        token = json.dumps([self._keys, values])
+        return base64.urlsafe_b64encode(token.encode('utf-8')).decode('ascii')
+
+    def _decode(self, cursor):
+        try:
+            token = base64.urlsafe_b64decode(str(cursor).encode('ascii'))
+            keys, values = json.loads(token.decode('utf-8'))
+            values = [
+                base64.b64decode(value[0].encode('ascii'))
+                if isinstance(value, list) else value
+                for value in values]
+        except (TypeError, ValueError, IndexError, AttributeError):
+            raise ValueError("invalid cursor: %s" % cursor)
+        if keys != self._keys or len(values) != len(keys):
+            raise ValueError("cursor does not match the sort columns")
+        return tuple(values)
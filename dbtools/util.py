@@ -1,93 +1,1727 @@
 import numpy as np
+import pandas as pd
 import sqlite3 as sql
 
-import sys
-if sys.version_info[0] >= 3:
-    int_types = (int,)
-    string_types = (str,)
-    blob_type = bytes
-else:
-    int_types = (int, long)
-    string_types = (str, unicode)
-    blob_type = buffer
+import atexit
+import gzip
+import io
+import os
+import threading
+import time
 
-def dict_to_dtypes(data, order=None):
+from collections import namedtuple, OrderedDict
+from contextlib import contextmanager
+from itertools import islice
+from operator import itemgetter
+
+from urllib.request import pathname2url, url2pathname
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+int_types = (int,)
+string_types = (str,)
+blob_type = bytes
+
+
+def dict_to_dtypes(data, order=None, sample=None):
+    r"""
+    Parses data types from a dictionary or list of dictionaries.
+
+    The dictionary keys will be paired with the types of the
+    corresponding values, e.g.::
+
+        (key, type(data[key]))
+
+    If there are multiple dictionaries that have the same keys, the
+    value types should be the same across dictionaries, with the
+    exception of None (which is ignored) and of numbers: a key with
+    both int and float values is a float, and one with both bool and
+    int values is an int.
+
+    For example::
+
+        dict_to_dtypes(data=[
+            {'name': 'apple', 'fruit': True, 'tree': True},
+            {'name': 'tomato', 'fruit': True, 'tree': False},
+            {'name': 'cucumber', 'fruit': False, 'tree': False}
+        ])
+
+    will return::
+
+        [('fruit', bool), ('name', str), ('tree', bool)]
+
+    Parameters
+    ----------
+    data : dictionary or list of dictionaries
+        Data to extract names and dtypes from.
+
+    order : list of strings (optional)
+        The order in which to return the dtypes in, by key. If None, the
+        dtypes will be sorted alphabetically by key.
+
+    sample : int (optional)
+        Only look at the first `sample` dictionaries. If None, all of
+        them are used.
+
+    Returns
+    -------
+    dtypes : :class:`RecordSchema`
+        A list of tuples of the form (key, dtype), which can also be
+        used to convert dictionaries into rows of values.
+
+    """
+
+    # if data is a dictionary, wrap it in a list
+    if hasattr(data, 'keys'):
+        data = [data]
+    data = list(islice(data, sample))
+
+    # make sure we have an ordering
+    if order is None:
+        order = sorted(set().union(*data))
+
+    columns = _record_columns(data, order)
+    return RecordSchema([
+        (key, _widen_type(
+            _native_types(set(map(type, column)), key), key))
+        for key, column in zip(order, columns)])
+
+
+def dicts_to_rows(data, order=None, sample=None):
+    r"""
+    Infer the column types of a dictionary or list of dictionaries (as
+    :func:`dict_to_dtypes` does), and convert them into rows.
+
+    This is quicker than calling :func:`dict_to_dtypes` and then
+    :meth:`RecordSchema.rows`, since the dictionaries are only
+    transposed into columns once. If `sample` is given, the values of
+    the dictionaries after the sample are checked against the inferred
+    types, and a ValueError is raised if they do not fit.
+
+    Parameters
+    ----------
+    data : dictionary or list of dictionaries
+        Data to extract names, dtypes and rows from.
+    order : list of strings (optional)
+        See :func:`dict_to_dtypes`.
+    sample : int (optional)
+        See :func:`dict_to_dtypes`.
+
+    Returns
+    -------
+    out : tuple
+        2-tuple of (:class:`RecordSchema`, list of row tuples)
+
+    """
+
+    if hasattr(data, 'keys'):
+        data = [data]
+    data = list(data)
+    if order is None:
+        order = sorted(set().union(*data[:sample]))
+
+    columns = _record_columns(data, order)
+    schema = RecordSchema([
+        (key, _widen_type(
+            _native_types(set(map(type, column[:sample])), key), key))
+        for key, column in zip(order, columns)])
+    if sample is not None and len(data) > sample:
+        schema._check_keys(data[sample:])
+    return schema, schema._columns_to_rows(columns)
+
+
+def _record_columns(records, keys):
+    r"""
+    Transpose the dictionaries in `records` into a list of the values of
+    each of `keys` (or None, where it is missing). This takes one pass
+    over the records per key, but each pass is a list comprehension,
+    which is quicker than a single Python loop over the records that
+    builds the rows.
+
+    """
+
+    return [[x.get(key, None) for x in records] for key in keys]
+
+
+def _native_types(types, key):
+    r"""
+    Map the set of value types `types` of the column `key` onto native
+    Python types (see :func:`_native_type`), ignoring None.
+
+    """
+
+    found = set(types)
+    found.discard(type(None))
+    native = set(map(_native_type, found))
+    if None in native:
+        raise ValueError("invalid data type for column '%s'" % key)
+    return native
+
+
+def _widen_type(types, key):
+    r"""
+    Find the type that can hold values of all the native Python types
+    in `types`, for the column `key`.
+
+    """
+
+    # numbers are widened from bool to int to float
+    if len(types) > 1 and types <= set([bool, int, float]):
+        types = set([float]) if float in types else set([int])
+    if len(types) != 1:
+        raise ValueError("could not determine datatype "
+                         "of column '%s'" % key)
+    return types.pop()
+
+
+def _to_native(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+class RecordSchema(list):
+    r"""
+    The column names and types of a list of dictionaries, as returned
+    by :func:`dict_to_dtypes`. This is a list of tuples of the form
+    (key, dtype), so it can be passed to :meth:`dbtools.Table.create` as
+    is, and it can also be reused to turn more dictionaries into rows,
+    e.g.::
+
+        schema = dict_to_dtypes(records[:1000])
+        tbl = Table.create(db, "foo", schema)
+        tbl.insert(schema.rows(records))
+
+    Values that do not fit the type of their column (other than None,
+    and numbers that can be widened to it) raise a ValueError, as do
+    dictionary keys that are not in the schema.
+
+    """
+
+    @property
+    def names(self):
+        r"""
+        The column names, in order.
+
+        """
+
+        return [key for key, dtype in self]
+
+    def rows(self, records):
+        r"""
+        Convert a list of dictionaries to a list of row tuples, with one
+        value for each of the columns (or None, where the key is missing).
+        Numpy scalars are converted to native Python objects.
+
+        """
+
+        if hasattr(records, 'keys'):
+            records = [records]
+        records = list(records)
+        self._check_keys(records)
+        return self._columns_to_rows(_record_columns(records, self.names))
+
+    def _check_keys(self, records):
+        extra = set().union(*records).difference(self.names)
+        if len(extra) > 0:
+            raise ValueError("unknown column(s): %s" % (
+                ", ".join(sorted(map(str, extra)))))
+
+    def _columns_to_rows(self, columns):
+        r"""
+        Check the values of each column against its type, convert numpy
+        scalars, and transpose the columns into rows.
+
+        """
+
+        for i, (key, dtype) in enumerate(self):
+            column = columns[i]
+            found = set(map(type, column))
+            native = _native_types(found, key)
+            fits = _FITS.get(dtype, set([dtype]))
+            if dtype is not None and not native <= fits:
+                raise ValueError(
+                    "values of column '%s' do not fit its type %s" % (
+                        key, dtype.__name__))
+            if any(issubclass(t, np.generic) for t in found):
+                columns[i] = list(map(_to_native, column))
+
+        return list(zip(*columns))
+
+
+# the native types of values that fit in a column of each type
+_FITS = {
+    int: set([bool, int]),
+    float: set([bool, int, float]),
+}
+
+
+def _native_type(t):
+    r"""
+    Map the type `t` (which may be a numpy scalar type or a subclass of
+    a builtin type) onto the native Python type used to describe
+    columns, or None if `t` is not a supported type.
+
+    """
+
+    if issubclass(t, (bool, np.bool_)):
+        return bool
+    elif issubclass(t, int_types + (np.integer,)):
+        return int
+    elif issubclass(t, (float, np.floating)):
+        return float
+    elif issubclass(t, string_types):
+        return str
+    elif issubclass(t, blob_type):
+        return blob_type
+    return None
+
+
+def parse_column(values, name=None):
+    r"""
+    Determine the datatype of a column of data and convert its values
+    to native Python objects in bulk.
+
+    For numeric and string arrays, the datatype is taken from the dtype
+    of the array. For object arrays, it is taken from the types of the
+    values that are not null, which must all be the same, except that
+    numbers are widened as in :func:`dict_to_dtypes`. Null values (None
+    or NaN) in object arrays are converted to None.
+
+    Parameters
+    ----------
+    values : array-like
+        The column of data, e.g. a numpy array, a list, or a
+        pandas Series or Index.
+    name : string (optional)
+        The name of the column, for error messages.
+
+    Returns
+    -------
+    dtype : type or None
+        The native Python type of the column, or None if the column is
+        empty or entirely null.
+    data : list
+        The values of the column as native Python objects.
+
+    """
+
+    values = np.asarray(values)
+    kind = values.dtype.kind
+
+    if kind in 'biufSU':
+        dtype = _native_type(values.dtype.type)
+
+    elif kind == 'O':
+        # replace null values with None
+        null = pd.isnull(values)
+        if null.any():
+            values = values.copy()
+            values[null] = None
+        # take the datatype from the types of the non-null values
+        types = set(map(type, values[~null]))
+        if len(types) > 0:
+            dtype = _widen_type(_native_types(types, name), name)
+        else:
+            dtype = None
+
+    else:
+        raise ValueError("invalid data type: %s" % values.dtype)
+
+    return dtype, values.tolist()
+
+
+def text_to_dtypes(names, rows):
+    r"""
+    Infer the datatypes of columns of text values, such as rows read
+    from a CSV file.
+
+    A column is parsed as int if all of its non-empty values are
+    integers, as float if they are all numbers, and as str otherwise
+    (including if it has no non-empty values).
+
+    Parameters
+    ----------
+    names : list of strings
+        The column names.
+    rows : list of sequences
+        The rows of text values.
+
+    Returns
+    -------
+    dtypes : list of 2-tuples
+        Each tuple in the list has the form (column name, dtype)
+
+    """
+
+    dtypes = []
+    for i, name in enumerate(names):
+        values = [row[i] for row in rows if row[i] != ""]
+        dtype = str
+        for t in (int, float):
+            if len(values) == 0:
+                break
+            try:
+                for x in values:
+                    t(x)
+            except ValueError:
+                continue
+            dtype = t
+            break
+        dtypes.append((name, dtype))
+
+    return dtypes
+
+
+def frame_to_columns(frame):
+    r"""
+    Split a DataFrame into columns of native Python objects (see
+    :func:`parse_column`). If the index of the DataFrame has a name, it
+    is included as the first column.
+
+    Parameters
+    ----------
+    frame : pandas.DataFrame
+        The data to split.
+
+    Returns
+    -------
+    dtypes : list of 2-tuples
+        Each tuple in the list has the form (column name, dtype)
+    columns : list of lists
+        The values of each column.
+
+    """
+
+    names = list(frame.columns)
+    columns = [frame.iloc[:, i] for i in range(len(names))]
+    if frame.index.name is not None:
+        names.insert(0, frame.index.name)
+        columns.insert(0, frame.index)
+
+    # parse data types from the column dtypes, and convert each column
+    # to native python objects in bulk
+    dtypes = []
+    for i in range(len(columns)):
+        dtype, columns[i] = parse_column(columns[i], names[i])
+        dtypes.append((names[i], dtype))
+
+    return dtypes, columns
+
+
+def is_columnar(data):
+    r"""
+    Check whether `data` holds columns of values rather than rows: either
+    a numpy structured (record) array, or a mapping from column names to
+    arrays, Series, lists or tuples, e.g.
+    ``{'age': np.array([25, 24]), 'name': [...]}``. DataFrames are not
+    treated as columnar here (see :func:`frame_to_columns`).
+
+    """
+
+    if isinstance(data, np.ndarray):
+        return data.dtype.names is not None
+    if (isinstance(data, pd.DataFrame) or not hasattr(data, 'keys') or
+            len(data) == 0):
+        return False
+    for value in data.values():
+        # only arrays, series, lists and tuples count as columns; str,
+        # bytes, bytearray and memoryview values are single entries
+        if isinstance(value, (np.ndarray, pd.Series)):
+            if value.ndim < 1:
+                return False
+        elif not isinstance(value, (list, tuple)):
+            return False
+    return True
+
+
+def arrays_to_columns(data):
+    r"""
+    Split columnar data (see :func:`is_columnar`) into columns of native
+    Python objects (see :func:`parse_column`). The datatypes are taken
+    from the dtypes of the arrays.
+
+    Parameters
+    ----------
+    data : numpy structured array or mapping of arrays
+        The data to split. The columns are taken in the order of the
+        fields of the array, or of the keys of the mapping.
+
+    Returns
+    -------
+    dtypes : list of 2-tuples
+        Each tuple in the list has the form (column name, dtype)
+    columns : list of lists
+        The values of each column.
+
+    """
+
+    if isinstance(data, np.ndarray):
+        names = list(data.dtype.names)
+        columns = [data[name] for name in names]
+    else:
+        names = list(data.keys())
+        columns = [data[name] for name in names]
+        if len(set(map(len, columns))) > 1:
+            raise ValueError("columns have different lengths")
+
+    dtypes = []
+    for i in range(len(columns)):
+        dtype, columns[i] = parse_column(columns[i], names[i])
+        dtypes.append((names[i], dtype))
+
+    return dtypes, columns
+
+
+def type_affinity(sqltype):
+    r"""
+    Determine the type affinity of a column from its declared SQL type,
+    following the rules that SQLite itself uses. See:
+
+    http://www.sqlite.org/datatype3.html#affname
+
+    Parameters
+    ----------
+    sqltype : string
+        The declared type of the column, e.g. "INTEGER" or "VARCHAR(10)".
+
+    Returns
+    -------
+    affinity : string
+        One of "INTEGER", "TEXT", "BLOB", "REAL" or "NUMERIC".
+
+    """
+
+    t = sqltype.upper()
+    if "INT" in t:
+        return "INTEGER"
+    elif "CHAR" in t or "CLOB" in t or "TEXT" in t:
+        return "TEXT"
+    elif "BLOB" in t or t == "":
+        return "BLOB"
+    elif "REAL" in t or "FLOA" in t or "DOUB" in t:
+        return "REAL"
+    return "NUMERIC"
+
+
+def _column_array(values, affinity):
+    r"""
+    Convert a sequence of values fetched from a column with the given
+    type affinity into a numpy array. Numeric columns become integer or
+    float arrays (with NULL as NaN) when possible, and everything else
+    becomes an object array.
+
+    """
+
+    if affinity == "REAL":
+        # SQLite stores numbers in REAL columns as floats, so anything
+        # else is NULL (which becomes NaN) or non-numeric text
+        try:
+            return np.fromiter(values, np.float64, len(values))
+        except (TypeError, ValueError):
+            pass
+
+    elif affinity in ("INTEGER", "NUMERIC"):
+        if len(values) == 0:
+            if affinity == "INTEGER":
+                return np.zeros(0, dtype=np.int64)
+            return np.zeros(0, dtype=np.float64)
+        arr = np.array(values)
+        if arr.dtype.kind in 'if':
+            return arr
+        # if there are NULL values, try to use a float array
+        if arr.dtype.kind == 'O' and None in values:
+            try:
+                return arr.astype(np.float64)
+            except (TypeError, ValueError):
+                pass
+
+    arr = np.empty(len(values), dtype=object)
+    arr[:] = values
+    return arr
+
+
+def rows_to_frame(rows, columns, affinities, index=None):
+    r"""
+    Build a DataFrame from rows of data fetched from the database.
+
+    Rather than parsing the rows one at a time, they are transposed into
+    columns which are each converted into a numpy array of a type
+    determined by the column's type affinity (see :func:`type_affinity`).
+    Columns that contain incompatible values (such as text in an
+    ``INTEGER`` column) fall back to object arrays.
+
+    Parameters
+    ----------
+    rows : list of tuples
+        The rows of data.
+    columns : list of strings
+        The column names, one for each element of a row.
+    affinities : list of strings
+        The type affinity of each column.
+    index : string (optional)
+        Name of the column to use as the index of the DataFrame.
+
+    Returns
+    -------
+    data : pandas.DataFrame
+        The DataFrame containing the data.
+
+    """
+
+    # transpose the rows into columns, one column at a time
+    arrays = {}
+    for i, (col, affinity) in enumerate(zip(columns, affinities)):
+        values = list(map(itemgetter(i), rows))
+        arrays[col] = _column_array(values, affinity)
+
+    # pull out the index
+    if index is not None:
+        idx = pd.Index(arrays.pop(index), name=index)
+        columns = [col for col in columns if col != index]
+    else:
+        idx = None
+
+    data = pd.DataFrame(arrays, columns=columns, index=idx, copy=False)
+    return data
+
+
+def require_pyarrow():
+    r"""
+    Raise an ImportError if pyarrow, which is needed for Arrow and
+    Parquet support, is not installed.
+
+    """
+
+    if pa is None:
+        raise ImportError("pyarrow is required for Arrow and Parquet support")
+
+
+def require_sqlite(version, feature):
+    r"""
+    Raise a RuntimeError if the SQLite library used by the sqlite3
+    module is older than `version`, which is needed for `feature`.
+
+    Parameters
+    ----------
+    version : tuple of ints
+        The minimum SQLite version, e.g. (3, 24, 0).
+    feature : string
+        Description of the feature that needs it, for the error message.
+
+    """
+
+    if sql.sqlite_version_info < tuple(version):
+        raise RuntimeError("%s requires SQLite %s or later (found %s)" % (
+            feature, ".".join(map(str, version)), sql.sqlite_version))
+
+
+def arrow_schema(columns, affinities, types=None):
+    r"""
+    Build an Arrow schema for columns of data fetched from the database.
+
+    If `types` is given, the type of each column is chosen from the
+    SQLite storage classes (as returned by ``typeof()``) of the values
+    it holds: int64 if they are all integers, float64 if they are all
+    numbers, binary if they are all blobs, and string otherwise. SQLite
+    columns may hold values of any type whatever their declared type,
+    e.g. a ``DATETIME`` column (which has ``NUMERIC`` affinity, see
+    :func:`type_affinity`) usually holds text.
+
+    The type affinity of a column is only used as a hint for columns
+    that hold nothing but NULL: ``INTEGER`` columns become int64,
+    ``REAL`` and ``NUMERIC`` columns become float64, ``TEXT`` columns
+    become strings and ``BLOB`` columns become binary.
+
+    Parameters
+    ----------
+    columns : list of strings
+        The column names.
+    affinities : list of strings
+        The type affinity of each column.
+    types : list of sets of strings (optional)
+        The storage classes of the (non-NULL) values in each column,
+        i.e. "integer", "real", "text" or "blob".
+
+    Returns
+    -------
+    schema : pyarrow.Schema
+        The Arrow schema.
+
+    """
+
+    require_pyarrow()
+    hints = {
+        "INTEGER": pa.int64(),
+        "REAL": pa.float64(),
+        "NUMERIC": pa.float64(),
+        "TEXT": pa.string(),
+        "BLOB": pa.binary(),
+    }
+    if types is None:
+        types = [set()] * len(columns)
+    fields = []
+    for col, affinity, found in zip(columns, affinities, types):
+        found = set(found)
+        found.discard("null")
+        if len(found) == 0:
+            t = hints[affinity]
+        elif found == set(["integer"]):
+            t = pa.int64()
+        elif found <= set(["integer", "real"]):
+            t = pa.float64()
+        elif found == set(["blob"]):
+            t = pa.binary()
+        else:
+            t = pa.string()
+        fields.append(pa.field(col, t))
+    return pa.schema(fields)
+
+
+def _to_text(value):
+    if value is None or isinstance(value, string_types):
+        return value
+    elif isinstance(value, blob_type):
+        return value.decode('utf-8', 'replace')
+    return str(value)
+
+
+def rows_to_batch(rows, schema):
+    r"""
+    Build an Arrow RecordBatch from rows of data fetched from the
+    database, converting one column at a time. Values in string columns
+    that are not text are converted to text. Any other value that does
+    not fit the type of its column (such as a float with a fractional
+    part in an int64 column, or an integer too large to be exactly
+    represented in a float64 column) raises a ValueError, rather than
+    being silently changed.
+
+    Parameters
+    ----------
+    rows : list of tuples
+        The rows of data.
+    schema : pyarrow.Schema
+        The schema of the batch (see :func:`arrow_schema`).
+
+    Returns
+    -------
+    batch : pyarrow.RecordBatch
+        The RecordBatch containing the data.
+
+    """
+
+    require_pyarrow()
+    arrays = []
+    for i, field in enumerate(schema):
+        values = list(map(itemgetter(i), rows))
+        # pyarrow truncates floats that are put in integer arrays
+        lossy = field.type == pa.int64() and any(
+            isinstance(x, float) and not x.is_integer() for x in values)
+        try:
+            if lossy:
+                raise pa.ArrowInvalid(field.name)
+            array = pa.array(values, type=field.type)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # text columns can take values of any other type
+            if field.type != pa.string():
+                raise ValueError(
+                    "values of column '%s' do not match its Arrow type %s" % (
+                        field.name, field.type))
+            array = pa.array(list(map(_to_text, values)), type=field.type)
+        arrays.append(array)
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def arrow_to_dtypes(schema):
+    r"""
+    Get the native Python type of each column in an Arrow schema.
+
+    Parameters
+    ----------
+    schema : pyarrow.Schema
+        The Arrow schema.
+
+    Returns
+    -------
+    dtypes : list of 2-tuples
+        Each tuple in the list has the form (column name, dtype)
+
+    """
+
+    require_pyarrow()
+    dtypes = []
+    for field in schema:
+        t = field.type
+        if pa.types.is_boolean(t):
+            dtype = bool
+        elif pa.types.is_integer(t):
+            dtype = int
+        elif pa.types.is_floating(t):
+            dtype = float
+        elif pa.types.is_string(t) or pa.types.is_large_string(t):
+            dtype = str
+        elif pa.types.is_binary(t) or pa.types.is_large_binary(t):
+            dtype = blob_type
+        elif pa.types.is_null(t):
+            dtype = None
+        else:
+            raise ValueError("invalid data type: %s" % t)
+        dtypes.append((field.name, dtype))
+
+    return dtypes
+
+
+def open_text(path, mode, compression=None):
+    r"""
+    Open a text file for reading or writing CSV data, optionally with
+    gzip compression.
+
+    Parameters
+    ----------
+    path : string
+        Path to the file.
+    mode : string
+        Either 'r' (read) or 'w' (write).
+    compression : string (optional)
+        Either 'gzip' or None. If None, gzip is used if `path` ends in
+        '.gz'.
+
+    Returns
+    -------
+    f : file
+        The opened file.
+
+    """
+
+    if compression is None and str(path).endswith(".gz"):
+        compression = "gzip"
+
+    if compression == "gzip":
+        return gzip.open(path, mode + "t", newline="")
+    elif compression is None:
+        return io.open(path, mode, newline="")
+    raise ValueError("invalid compression: %s" % compression)
+
+
+def readonly_uri(db):
+    r"""
+    Get a URI that opens the database `db` in read-only mode, e.g.
+    ``file:/home/data.db?mode=ro``. The URI can be used anywhere that a
+    database path can.
+
+    Parameters
+    ----------
+    db : string
+        Path to the SQLite database.
+
+    Returns
+    -------
+    uri : string
+        The read-only URI.
+
+    """
+
+    return "file:%s?mode=ro" % pathname2url(os.path.abspath(str(db)))
+
+
+def db_path(db):
+    r"""
+    Get the path to the database file from `db`, which may be either a
+    path or a URI (see :func:`readonly_uri`).
+
+    """
+
+    db = str(db)
+    if db.startswith("file:"):
+        return url2pathname(db[len("file:"):].split("?")[0])
+    return db
+
+
+def _file_id(db):
+    r"""
+    Identify the file backing the database `db` by its device and inode
+    numbers, or return None if the file does not exist.
+
+    """
+
+    try:
+        st = os.stat(db_path(db))
+    except OSError:
+        return None
+    return (st.st_dev, st.st_ino)
+
+
+class ConnectionPool(object):
+    r"""
+    A pool of reusable connections to the SQLite database `db`.
+
+    Connections are handed out to one thread at a time by
+    :meth:`acquire` and given back with :meth:`release`, so a single
+    pool may be shared between threads. At most `max_size` idle
+    connections are kept open, and connections that have been idle for
+    longer than `idle_timeout` seconds are closed.
+
+    If the database file is removed or replaced, idle connections to
+    the old file are discarded rather than reused, and the cached schema
+    of the database (see :func:`get_schema`) is cleared.
+
+    SQLite connections must not be used across ``fork()``, so in a
+    forked child process the pools inherited from the parent are
+    abandoned, and new ones are created by :func:`get_pool`.
+
+    Parameters
+    ----------
+    db : string
+        Path to the SQLite database, or a URI (see :func:`readonly_uri`).
+    max_size : int (optional)
+        Maximum number of idle connections to keep open.
+    idle_timeout : float (optional)
+        Number of seconds after which an idle connection is closed. If
+        None, idle connections are never closed.
+    pragmas : dict (optional)
+        Pragmas to set on each new connection (see :data:`PROFILES`).
+    cached_statements : int (optional)
+        Number of compiled statements that each connection keeps for
+        reuse. This is larger than the sqlite3 default of 128, so that
+        the statements generated by :class:`dbtools.Table` stay compiled.
+
+    """
+
+    def __init__(self, db, max_size=5, idle_timeout=60.0, pragmas=None,
+                 cached_statements=512):
+        self.db = str(db)
+        self.max_size = int(max_size)
+        self.idle_timeout = idle_timeout
+        self.pragmas = dict(pragmas or {})
+        self.cached_statements = int(cached_statements)
+        self.closed = False
+        # the process that opened the connections (see `_abandon`)
+        self.pid = os.getpid()
+
+        # cached schema of the database (see `get_schema`)
+        self.schema = None
+        # cache of query results (see `get_query_cache`)
+        self.query_cache = None
+
+        self._lock = threading.Lock()
+        # list of (connection, file id, pragma generation, time of last
+        # use) tuples
+        self._idle = []
+        # maps connections that are in use to their file ids and pragma
+        # generations
+        self._in_use = {}
+        # incremented whenever the pragmas change, so that connections
+        # opened with the old pragmas are not reused
+        self._generation = 0
+        # the file id that was seen most recently
+        self._file_id = None
+
+    def _connect(self):
+        r"""
+        Open a new connection to the database.
+
+        """
+
+        conn = sql.connect(
+            self.db, check_same_thread=False,
+            cached_statements=self.cached_statements,
+            uri=self.db.startswith("file:"))
+        readonly = "mode=ro" in self.db
+        for pragma, value in _ordered_pragmas(self.pragmas):
+            # a read-only connection can't change the database file
+            if readonly and pragma in _WRITE_PRAGMAS:
+                continue
+            conn.execute("PRAGMA %s=%s" % (pragma, value))
+        return conn
+
+    def set_pragmas(self, pragmas):
+        r"""
+        Change the pragmas that are set on each new connection. Idle
+        connections, which were opened with the old pragmas, are closed,
+        and so are connections that are in use once they are released.
+
+        Parameters
+        ----------
+        pragmas : dict
+            The new pragmas.
+
+        """
+
+        with self._lock:
+            self.pragmas = dict(pragmas)
+            self._generation += 1
+            idle = self._idle
+            self._idle = []
+
+        for conn, fid, gen, last_used in idle:
+            conn.close()
+
+    def _evict(self, file_id):
+        r"""
+        Remove connections that are stale (i.e., idle for too long,
+        opened on a different file, or opened with old pragmas) from the
+        idle list, and return them. Must be called with the lock held.
+
+        """
+
+        now = time.time()
+        keep = []
+        stale = []
+        for conn, fid, gen, last_used in self._idle:
+            if fid != file_id or gen != self._generation:
+                stale.append(conn)
+            elif (self.idle_timeout is not None and
+                    now - last_used > self.idle_timeout):
+                stale.append(conn)
+            else:
+                keep.append((conn, fid, gen, last_used))
+        self._idle = keep
+        return stale
+
+    def acquire(self):
+        r"""
+        Get a connection from the pool, opening a new one if there are
+        no idle connections available.
+
+        Returns
+        -------
+        conn : sqlite3.Connection
+            A connection to the database. It must be given back to the
+            pool with :meth:`release` once it is no longer needed.
+
+        """
+
+        if self.pid != os.getpid():
+            self._abandon()
+        if self.closed:
+            raise ValueError("connection pool is closed: %s" % self.db)
+
+        file_id = _file_id(self.db)
+        conn = None
+        with self._lock:
+            # if the file has changed, so has its schema
+            if file_id != self._file_id:
+                self.schema = None
+                self._file_id = file_id
+            stale = self._evict(file_id)
+            if len(self._idle) > 0:
+                conn = self._idle.pop()[0]
+                self._in_use[conn] = (file_id, self._generation)
+
+        for c in stale:
+            c.close()
+
+        if conn is None:
+            with self._lock:
+                generation = self._generation
+            conn = self._connect()
+            with self._lock:
+                self._file_id = _file_id(self.db)
+                self._in_use[conn] = (self._file_id, generation)
+
+        return conn
+
+    def release(self, conn):
+        r"""
+        Give a connection obtained from :meth:`acquire` back to the
+        pool. Any transaction that is still open is rolled back.
+
+        Parameters
+        ----------
+        conn : sqlite3.Connection
+            The connection to release.
+
+        """
+
+        if self.pid != os.getpid():
+            _inherited.append(conn)
+            self._abandon()
+            return
+
+        if conn.in_transaction:
+            conn.rollback()
+
+        with self._lock:
+            file_id, generation = self._in_use.pop(conn, (None, None))
+            keep = (not self.closed and
+                    file_id is not None and
+                    generation == self._generation and
+                    len(self._idle) < self.max_size)
+            if keep:
+                self._idle.append((conn, file_id, generation, time.time()))
+
+        if not keep:
+            conn.close()
+
+    @contextmanager
+    def connection(self):
+        r"""
+        Context manager that acquires a connection from the pool and
+        releases it again on exit, e.g.::
+
+            with pool.connection() as conn:
+                conn.execute("SELECT * FROM People")
+
+        """
+
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        r"""
+        Close all idle connections. Connections that are currently in
+        use are closed when they are released. The pool cannot be used
+        after it has been closed.
+
+        """
+
+        with self._lock:
+            self.closed = True
+            idle = self._idle
+            self._idle = []
+
+        for conn, fid, gen, last_used in idle:
+            conn.close()
+        if self.query_cache is not None:
+            self.query_cache.close()
+
+    def _abandon(self):
+        r"""
+        Give up the pool in a process that was forked from the one that
+        opened its connections. The connections are neither reused nor
+        closed (closing them could roll back or checkpoint the parent's
+        work, or release its locks), but are kept referenced so that
+        they are never garbage collected. The lock is not taken, since
+        another thread may have held it when the process forked.
+
+        """
+
+        self.closed = True
+        _inherited.extend([conn for conn, fid, gen, last_used in self._idle])
+        _inherited.extend(self._in_use)
+        if self.query_cache is not None:
+            _inherited.append(self.query_cache)
+        self._idle = []
+        self._in_use = {}
+        self.query_cache = None
+
+
+#: Named sets of pragmas that can be applied to the connections to a
+#: database with :func:`set_profile`. The 'performance' profile uses a
+#: write-ahead log, so that readers and a writer do not block each
+#: other, and only syncs to disk at checkpoints rather than on every
+#: commit.
+PROFILES = {
+    'default': {},
+    'performance': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -65536,
+        'mmap_size': 268435456,
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,
+    },
+}
+
+
+#: Pragmas that change the database file, and so are not set on
+#: read-only connections.
+_WRITE_PRAGMAS = ('journal_mode',)
+
+
+def _ordered_pragmas(pragmas):
+    r"""
+    Sort pragmas so that ``journal_mode`` is set first, as some other
+    pragmas (e.g., ``synchronous``) depend on it.
+
+    """
+
+    return sorted(pragmas.items(),
+                  key=lambda x: (x[0] != 'journal_mode', x[0]))
+
+
+def set_profile(db, profile):
+    r"""
+    Set the pragmas that are applied to every connection to the
+    database `db`, e.g.::
+
+        set_profile("data.db", "performance")
+        set_profile("data.db", {'journal_mode': 'WAL', 'cache_size': -8192})
+
+    Parameters
+    ----------
+    db : string
+        Path to the SQLite database.
+    profile : string or dict
+        The name of a profile in :data:`PROFILES`, or a dictionary
+        mapping pragma names to values. On read-only connections (see
+        :func:`readonly_uri`), pragmas that change the database file,
+        such as ``journal_mode``, are skipped.
+
+    """
+
+    get_pool(db, pragmas=profile_pragmas(profile))
+
+
+def profile_pragmas(profile):
     r"""
-    Parses data types from a dictionary or list of dictionaries.
+    Get the pragmas of `profile`, which is either the name of a profile
+    in :data:`PROFILES` or a dictionary of pragmas (see
+    :func:`set_profile`).
 
-    The dictionary keys will be paired with the types of the
-    corresponding values, e.g.::
+    """
 
-        (key, type(data[key]))
+    if isinstance(profile, string_types):
+        if profile not in PROFILES:
+            raise ValueError("no such profile: %s" % profile)
+        profile = PROFILES[profile]
+    return dict(profile)
 
-    If there are multiple dictionaries that have the same keys, the
-    value types should be the same across dictionaries (with the
-    exception of NoneType).
 
-    For example::
+_pools = {}
+_pools_lock = threading.Lock()
+# the process that `_pools` belongs to, and the connections (and query
+# caches) that were inherited from a parent process
+_pools_pid = os.getpid()
+_inherited = []
 
-        dict_to_dtypes(data=[
-            {'name': 'apple', 'fruit': True, 'tree': True},
-            {'name': 'tomato', 'fruit': True, 'tree': False},
-            {'name': 'cucumber', 'fruit': False, 'tree': False}
-        ])
 
-    will return::
+def _after_fork():
+    r"""
+    Abandon the connection pools that were inherited from the parent
+    process, if this is a forked child, so that it opens its own
+    connections (see :meth:`ConnectionPool._abandon`).
 
-        [('fruit', bool), ('name', str), ('tree', bool)]
+    """
+
+    global _pools, _pools_lock, _pools_pid, _local
+    if _pools_pid == os.getpid():
+        return
+    for pool in _pools.values():
+        pool._abandon()
+    _pools = {}
+    # the lock and the active transactions belong to the parent's threads
+    _pools_lock = threading.Lock()
+    _local = threading.local()
+    _pools_pid = os.getpid()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+def _pool_key(db):
+    db = str(db)
+    if db == ":memory:" or db.startswith("file:"):
+        return db
+    return os.path.abspath(db)
+
+
+def get_pool(db, **kwargs):
+    r"""
+    Get the connection pool for the database `db`, creating it if it
+    does not exist yet. There is only one pool per database, so all
+    calls with the same database share their connections.
 
     Parameters
     ----------
-    data : dictionary or list of dictionaries
-        Data to extract names and dtypes from.
+    db : string
+        Path to the SQLite database.
+    kwargs : (optional)
+        Options for the pool (see :class:`ConnectionPool`). If the pool
+        already exists, these options are applied to it.
 
-    order : list of strings (optional)
-        The order in which to return the dtypes in, by key. If None, the
-        dtypes will be sorted alphabetically by key.
+    Returns
+    -------
+    pool : dbtools.util.ConnectionPool
+        The connection pool for `db`.
+
+    """
+
+    _after_fork()
+    key = _pool_key(db)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool.closed:
+            pool = ConnectionPool(db, **kwargs)
+            _pools[key] = pool
+        else:
+            for option, value in kwargs.items():
+                if option == 'pragmas':
+                    if value != pool.pragmas:
+                        pool.set_pragmas(value)
+                elif option in ('max_size', 'idle_timeout',
+                                'cached_statements'):
+                    setattr(pool, option, value)
+                else:
+                    raise TypeError("invalid pool option: %s" % option)
+
+    return pool
+
+
+def close_pools(db=None):
+    r"""
+    Close pooled connections and dispose of the connection pools.
+
+    Parameters
+    ----------
+    db : string (optional)
+        Path to the SQLite database whose pool should be closed. If
+        None, the pools for all databases are closed.
+
+    """
+
+    _after_fork()
+    with _pools_lock:
+        if db is None:
+            pools = list(_pools.values())
+            _pools.clear()
+        else:
+            pool = _pools.pop(_pool_key(db), None)
+            pools = [] if pool is None else [pool]
+
+    for pool in pools:
+        pool.close()
+
+
+atexit.register(close_pools)
+
+
+_local = threading.local()
+
+
+def _transactions():
+    r"""
+    Get the dictionary mapping pool keys to the connections of the
+    transactions that are active in the current thread.
+
+    """
+
+    _after_fork()
+    if not hasattr(_local, 'transactions'):
+        _local.transactions = {}
+    return _local.transactions
+
+
+@contextmanager
+def transaction(db, pragmas=None):
+    r"""
+    Context manager that runs all commands on the database `db` from
+    the current thread within a single transaction, e.g.::
+
+        with transaction("data.db"):
+            tbl.insert(["Alyssa P. Hacker", 25, 66.24])
+            tbl.update({'age': 26}, where="name='Ben Bitdiddle'")
+
+    The transaction is committed when the block exits normally, and
+    rolled back if it raises an exception. Nested transactions on the
+    same database are merged into the outermost one.
+
+    Parameters
+    ----------
+    db : string
+        Path to the SQLite database.
+    pragmas : dict (optional)
+        Pragmas to set on the connection for the duration of the
+        transaction, e.g. ``{'synchronous': 'OFF'}``. Their previous
+        values are restored afterwards. They are ignored if the
+        transaction is merged into an outer one.
 
     Returns
     -------
-    dtypes : list of 2-tuples
-        Each tuple in the list has the form (key, dtype)
+    conn : sqlite3.Connection
+        The connection that the transaction is running on.
 
     """
 
-    # if data is a dictionary, wrap it in a list
-    if hasattr(data, 'keys'):
-        data = [data]
+    key = _pool_key(db)
+    transactions = _transactions()
 
-    # build a dictionary mapping keys to sets of types
-    all_types = {}
-    for x in data:
-        for key in x:
-            if key not in all_types:
-                all_types[key] = set()
-            if x[key] is not None:
-                all_types[key].add(type(x[key]))
+    # join the active transaction, if there is one
+    if key in transactions:
+        yield transactions[key]
+        return
 
-    # make sure we have an ordering
-    if order is None:
-        order = sorted(all_types.keys())
+    with get_pool(db).connection() as conn:
+        # set the pragmas (which cannot be changed inside the
+        # transaction), remembering their old values
+        old = []
+        if pragmas is not None:
+            for pragma, value in _ordered_pragmas(pragmas):
+                old_value = conn.execute("PRAGMA %s" % pragma).fetchone()[0]
+                old.append((pragma, old_value))
+                conn.execute("PRAGMA %s=%s" % (pragma, value))
+
+        transactions[key] = conn
+        try:
+            with conn:
+                conn.execute("BEGIN")
+                yield conn
+        finally:
+            del transactions[key]
+            for pragma, value in reversed(old):
+                conn.execute("PRAGMA %s=%s" % (pragma, value))
+
+
+@contextmanager
+def _connection(db):
+    r"""
+    Context manager that provides a connection for running commands on
+    the database `db`. If a transaction is active on `db` in the
+    current thread, its connection is used. Otherwise, a connection is
+    borrowed from the pool and the commands are committed on exit.
+
+    """
+
+    conn = _transactions().get(_pool_key(db), None)
+    if conn is not None:
+        yield conn
+    else:
+        with get_pool(db).connection() as conn:
+            with conn:
+                yield conn
+
+
+class Schema(object):
+    r"""
+    The tables in a database, as of a particular schema version.
+
+    Attributes
+    ----------
+    version : int
+        The schema version (see ``PRAGMA schema_version``).
+    names : list of strings
+        Names of the tables, in the order in which they were created.
+    tables : dict
+        Maps table names to their ``CREATE TABLE`` statements.
+    info : dict
+        Maps table names to other metadata derived from the schema,
+        which is cached along with it (see :meth:`dbtools.Table.__init__`).
+
+    """
+
+    def __init__(self, version, tables):
+        self.version = version
+        self.names = [name for name, sql in tables]
+        self.tables = dict(tables)
+        self.info = {}
+
+
+def get_schema(db, verbose=False):
+    r"""
+    Get the schema of the database `db`.
+
+    The schema is cached in the database's connection pool, and is only
+    read again from ``sqlite_master`` when the database's ``PRAGMA
+    schema_version`` changes (i.e., when a table is created, altered or
+    dropped) or the database file is replaced, so that repeated calls
+    are cheap.
+
+    Parameters
+    ----------
+    db : string
+        Path to the SQLite database.
+    verbose : bool (optional)
+        Print the commands that are run.
+
+    Returns
+    -------
+    schema : dbtools.util.Schema
+        The schema of the database.
+
+    """
+
+    pool = get_pool(db)
+
+    with _connection(db) as conn:
+        cmd = "PRAGMA schema_version"
+        if verbose:
+            print(cmd)
+        version = conn.execute(cmd).fetchone()[0]
+
+        # use the cached schema, if it is up to date
+        schema = pool.schema
+        if schema is not None and schema.version == version:
+            return schema
+
+        cmd = "SELECT name, sql FROM sqlite_master WHERE type='table'"
+        if verbose:
+            print(cmd)
+        tables = conn.execute(cmd).fetchall()
+
+    schema = Schema(version, tables)
+
+    # don't cache schema changes that might still be rolled back
+    if _pool_key(db) not in _transactions():
+        pool.schema = schema
+
+    return schema
+
+
+def in_transaction(db):
+    r"""
+    Check whether a :func:`transaction` is active on the database `db`
+    in the current thread.
+
+    """
+
+    return _pool_key(db) in _transactions()
 
-    # make sure each key has a datatype associated with it and build
-    # up the list of (key, dtype) tuples
-    types = []
-    for key in order:
-        t = list(all_types[key])
-        if len(t) != 1:
-            raise ValueError("could not determine datatype "
-                             "of column '%s'" % key)
-        # convert numpy dtypes into native python types
-        tt = type(np.asscalar(np.array([0], dtype=t[0])))
-        types.append((key, tt))
 
-    return types
+class QueryCache(object):
+    r"""
+    A least-recently-used cache of query results for the database `db`.
+
+    The cache keeps its own connection to the database, on which it
+    checks ``PRAGMA data_version`` before every lookup. This changes
+    whenever any other connection (including the pooled connections of
+    this process) commits a change to the database, at which point the
+    whole cache is cleared.
+
+    Parameters
+    ----------
+    db : string
+        Path to the SQLite database.
+    max_entries : int (optional)
+        Maximum number of results to keep.
+    max_bytes : int (optional)
+        Maximum total size of the results to keep, in bytes. If None,
+        the size is not limited.
+
+    """
+
+    def __init__(self, db, max_entries=128, max_bytes=None):
+        self.db = str(db)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._conn = None
+        self._version = None
+
+    def _check(self):
+        r"""
+        Clear the cache if the database has changed, and return the
+        current version of the database. Must be called with the lock
+        held.
+
+        """
+
+        # reconnect if the database file was replaced
+        file_id = _file_id(self.db)
+        if self._conn is not None and (
+                self._version is None or self._version[0] != file_id):
+            self._conn.close()
+            self._conn = None
+        if self._conn is None:
+            self._conn = sql.connect(
+                self.db, check_same_thread=False,
+                uri=self.db.startswith("file:"))
+            file_id = _file_id(self.db)
+
+        cmd = "PRAGMA data_version"
+        version = (file_id, self._conn.execute(cmd).fetchone()[0])
+        if version != self._version:
+            self._entries.clear()
+            self.nbytes = 0
+            self._version = version
+
+        return version
+
+    def get(self, key):
+        r"""
+        Look up the result for `key`.
+
+        Returns
+        -------
+        out : tuple
+            2-tuple of (a copy of the result, or None if there is no up
+            to date result, database version). The version should be
+            passed to :meth:`put` along with the result of the query.
+
+        """
+
+        with self._lock:
+            version = self._check()
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None, version
+            # move the entry to the end, as it was used most recently
+            self._entries[key] = entry
+
+        return entry[0].copy(), version
+
+    def put(self, key, data, version):
+        r"""
+        Store the result `data` of the query `key`, which was run at the
+        database version `version` (see :meth:`get`). The result is not
+        stored if the database has changed since then.
+
+        """
+
+        nbytes = int(data.memory_usage(index=True, deep=True).sum())
+        if self.max_bytes is not None and nbytes > self.max_bytes:
+            return
+
+        with self._lock:
+            if version != self._version:
+                return
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.nbytes -= old[1]
+            self._entries[key] = (data.copy(), nbytes)
+            self.nbytes += nbytes
+
+            # evict the least recently used results
+            while len(self._entries) > 0 and (
+                    len(self._entries) > self.max_entries or
+                    (self.max_bytes is not None and
+                     self.nbytes > self.max_bytes)):
+                key, (old, old_nbytes) = self._entries.popitem(last=False)
+                self.nbytes -= old_nbytes
+
+    def clear(self):
+        r"""
+        Remove all results from the cache.
+
+        """
+
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def close(self):
+        r"""
+        Clear the cache and close its connection to the database.
+
+        """
+
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+            self._version = None
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def get_query_cache(db, **kwargs):
+    r"""
+    Get the query result cache for the database `db`, creating it if it
+    does not exist yet. The cache is shared by all Tables in the
+    database that use it (see :class:`QueryCache`).
+
+    Parameters
+    ----------
+    db : string
+        Path to the SQLite database.
+    kwargs : (optional)
+        Options for the cache (`max_entries` and `max_bytes`). If the
+        cache already exists, these options are applied to it.
+
+    Returns
+    -------
+    cache : dbtools.util.QueryCache
+        The query cache for `db`.
+
+    """
+
+    pool = get_pool(db)
+    with _pools_lock:
+        if pool.query_cache is None:
+            pool.query_cache = QueryCache(db, **kwargs)
+        else:
+            for option, value in kwargs.items():
+                if option not in ('max_entries', 'max_bytes'):
+                    raise TypeError("invalid cache option: %s" % option)
+                setattr(pool.query_cache, option, value)
+
+    return pool.query_cache
+
+
+class ColumnInfo(namedtuple('ColumnInfo', [
+        'name', 'type', 'affinity', 'notnull', 'default', 'primary_key'])):
+    r"""
+    Description of a column in a table.
+
+    Attributes
+    ----------
+    name : string
+        Name of the column.
+    type : string
+        Declared type of the column, e.g. "INTEGER" (may be empty).
+    affinity : string
+        Type affinity of the column (see :func:`type_affinity`).
+    notnull : bool
+        Whether the column has a ``NOT NULL`` constraint.
+    default : string or None
+        The SQL text of the column's default value, if it has one.
+    primary_key : bool
+        Whether the column is (part of) the primary key.
+
+    """
+
+    __slots__ = ()
+
+
+def table_info(db, name, verbose=False):
+    r"""
+    Get a description of the columns of the table `name` in the
+    database `db`, using ``PRAGMA table_info``.
+
+    Parameters
+    ----------
+    db : string
+        Path to the SQLite database.
+    name : string
+        Name of the table.
+    verbose : bool (optional)
+        Print the command that is run.
+
+    Returns
+    -------
+    columns : tuple of dbtools.util.ColumnInfo
+        The columns of the table, in order.
+
+    """
+
+    cmd = "PRAGMA table_info(%s)" % name
+    rows = sql_execute(db, cmd, fetchall=True, verbose=verbose)
+
+    # each row has the form (cid, name, type, notnull, dflt_value, pk)
+    columns = tuple([
+        ColumnInfo(
+            name=row[1],
+            type=row[2],
+            affinity=type_affinity(row[2]),
+            notnull=bool(row[3]),
+            default=row[4],
+            primary_key=bool(row[5]))
+        for row in rows])
+
+    return columns
 
 
 def sql_execute(db, cmd, fetchall=False, verbose=False):
     r"""
     Execute a SQL command `cmd` in database `db`.
 
+    The command is run on a connection borrowed from the database's
+    connection pool (see :func:`get_pool`), and is committed when it
+    completes successfully, unless it is run within a
+    :func:`transaction`.
+
     Parameters
     ----------
     db : string
@@ -113,9 +1747,8 @@ def sql_execute(db, cmd, fetchall=False, verbose=False):
     if isinstance(cmd, string_types):
         cmd = [cmd]
 
-    # connect to the database
-    conn = sql.connect(db)
-    with conn:
+    # get a connection to the database
+    with _connection(db) as conn:
         # get the database cursor
         cur = conn.cursor()
         # optionally print the command we're running
@@ -130,3 +1763,108 @@ def sql_execute(db, cmd, fetchall=False, verbose=False):
             result = None
 
     return result
+
+
+def sql_executemany(db, cmd, params, chunksize=None, verbose=False):
+    r"""
+    Execute a SQL command `cmd` in database `db` once for each set of
+    parameters in `params`, all within a single transaction.
+
+    Parameters
+    ----------
+    db : string
+        Path to the SQLite database.
+    cmd : string
+        Command to be executed.
+    params : iterable of sequences
+        Parameters for each execution of the command. See:
+
+        http://docs.python.org/2/library/sqlite3.html#sqlite3.Cursor.executemany
+    chunksize : int (optional)
+        If given, `params` is consumed and executed `chunksize` entries
+        at a time, so that at most that many entries are held in
+        memory at once. All chunks are still part of one transaction.
+    verbose : bool (optional)
+        Print the command that is run.
+
+    Returns
+    -------
+    count : int
+        The total number of rows modified by the command.
+
+    """
+
+    if chunksize is not None and chunksize < 1:
+        raise ValueError("invalid chunk size: %s" % chunksize)
+
+    # get a connection to the database
+    with _connection(db) as conn:
+        # get the database cursor
+        cur = conn.cursor()
+        # optionally print the command we're running
+        if verbose:
+            print(cmd)
+        # run the command, optionally in chunks
+        if chunksize is None:
+            cur.executemany(cmd, params)
+            count = cur.rowcount
+        else:
+            params = iter(params)
+            count = 0
+            while True:
+                chunk = list(islice(params, chunksize))
+                if len(chunk) == 0:
+                    break
+                cur.executemany(cmd, chunk)
+                count += cur.rowcount
+
+    return count
+
+
+def sql_iterate(db, cmd, chunksize, verbose=False):
+    r"""
+    Execute a SQL query `cmd` in database `db`, and iterate over the
+    result in chunks of at most `chunksize` rows.
+
+    The connection used for the query is held, with its read open,
+    until the iteration finishes (or the iterator is closed). Unless the
+    database is in WAL mode, or the query runs inside a
+    :func:`transaction`, writes from other connections wait for the read
+    to end and fail with "database is locked" after the busy timeout.
+
+    Parameters
+    ----------
+    db : string
+        Path to the SQLite database.
+    cmd : string or list
+        Query to be executed (see :func:`sql_execute`).
+    chunksize : int
+        Maximum number of rows to fetch at a time.
+    verbose : bool (optional)
+        Print the command that is run.
+
+    Returns
+    -------
+    chunks : generator
+        Generator of lists of rows.
+
+    """
+
+    # wrap the command in a list, if it isn't one already
+    if isinstance(cmd, string_types):
+        cmd = [cmd]
+
+    # get a connection to the database
+    with _connection(db) as conn:
+        # get the database cursor
+        cur = conn.cursor()
+        # optionally print the command we're running
+        if verbose:
+            print(", ".join([str(x) for x in cmd]))
+        # run the command and fetch the result a chunk at a time
+        cur.execute(*cmd)
+        while True:
+            rows = cur.fetchmany(chunksize)
+            if len(rows) == 0:
+                break
+            yield rows
@@ -0,0 +1,181 @@
+import atexit
+import threading
+
+from .util import transaction
+
+
+class TableWriter(object):
+    r"""
+    Buffer rows that are inserted into a table, and write them to the
+    database in batches from a background thread, e.g.::
+
+        with tbl.writer(flush_rows=1000, flush_interval=1.0) as w:
+            for row in rows:
+                w.insert(row)
+
+    Each call to :meth:`insert` only checks the values and adds them
+    to an in-memory buffer, so it takes the same (short) time however
+    slow the disk is. The buffer is written in a single transaction
+    whenever it holds `flush_rows` rows, or `flush_interval` seconds
+    after the last write, whichever comes first.
+
+    If a write fails, its rows are not inserted, and the error is
+    raised by the next call to :meth:`insert`, :meth:`flush` or
+    :meth:`close`. The writer is closed (and so flushed) when the
+    ``with`` block exits, or otherwise when the interpreter exits.
+
+    Parameters
+    ----------
+    table : :class:`dbtools.Table`
+        The table to insert the rows into.
+    flush_rows : int (default=1000)
+        Number of buffered rows at which the buffer is written.
+    flush_interval : float (default=1.0)
+        Maximum time, in seconds, that rows are kept in the buffer. If
+        None, the buffer is only written when it is full.
+
+    """
+
+    def __init__(self, table, flush_rows=1000, flush_interval=1.0):
+        if flush_rows < 1:
+            raise ValueError("invalid number of rows: %s" % flush_rows)
+        if flush_interval is not None and flush_interval <= 0:
+            raise ValueError("invalid flush interval: %s" % flush_interval)
+
+        self.table = table
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+
+        # list of (columns, rows) to write, and the total number of rows
+        self._buffer = []
+        self._size = 0
+        self._error = None
+        self._closed = False
+        # `_cond` guards the buffer, and `_write_lock` makes sure that
+        # the buffers are written in the order that they were filled
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+
+        self._thread = threading.Thread(
+            target=self._run, name="dbtools writer: %s" % table.name)
+        self._thread.daemon = True
+        self._thread.start()
+        with _writers_lock:
+            _writers.add(self)
+
+    def insert(self, values):
+        r"""
+        Add values to the buffer. See :meth:`dbtools.Table.insert` for
+        the accepted formats.
+
+        """
+
+        self._raise()
+        cols, rows = self.table._entries(values)
+        rows = list(rows)
+        with self._cond:
+            if self._closed:
+                raise ValueError("writer is closed")
+            if len(self._buffer) > 0 and self._buffer[-1][0] == cols:
+                self._buffer[-1][1].extend(rows)
+            else:
+                self._buffer.append((cols, rows))
+            self._size += len(rows)
+            if self._size >= self.flush_rows:
+                self._cond.notify()
+
+    def flush(self):
+        r"""
+        Write the buffered rows to the database, and wait until they
+        have been written.
+
+        """
+
+        self._write()
+        self._raise()
+
+    def close(self):
+        r"""
+        Write the buffered rows to the database and stop the background
+        thread.
+
+        """
+
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        with _writers_lock:
+            _writers.discard(self)
+        self._raise()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._closed and self._size < self.flush_rows:
+                    self._cond.wait(self.flush_interval)
+                closed = self._closed
+            self._write()
+            if closed:
+                break
+
+    def _write(self):
+        with self._write_lock:
+            with self._cond:
+                batch = self._buffer
+                self._buffer = []
+                self._size = 0
+            if len(batch) == 0:
+                return
+
+            try:
+                with transaction(self.table.db):
+                    for cols, rows in batch:
+                        self.table._insert_rows(cols, rows)
+            except Exception as err:
+                # keep the first error, to be raised in the caller's
+                # thread
+                with self._cond:
+                    if self._error is None:
+                        self._error = err
+
+    def _raise(self):
+        with self._cond:
+            err = self._error
+            self._error = None
+        if err is not None:
+            raise err
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+_writers = set()
+_writers_lock = threading.Lock()
+
+
+def close_writers():
+    r"""
+    Close all open :class:`TableWriter` objects, writing their buffered
+    rows. This is called automatically when the interpreter exits.
+
+    """
+
+    with _writers_lock:
+        writers = list(_writers)
+    # close every writer before raising the first error
+    error = None
+    for writer in writers:
+        try:
+            writer.close()
+        except Exception as err:
+            if error is None:
+                error = err
+    if error is not None:
+        raise error
+
+
+atexit.register(close_writers)
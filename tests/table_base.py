@@ -1,10 +1,12 @@
+import gzip
 import numpy as np
 import os
 
 from nose.tools import raises
+from nose.plugins.skip import SkipTest
 from sqlite3 import OperationalError
 
-from dbtools import Table
+from dbtools import Table, transaction
 from . import DBNAME, RewriteDocstringMeta
 
 try:
@@ -143,12 +145,105 @@ class TestTable(object):
         data = self.tbl.select()
         assert self.check(self.idata, data)
 
+    def test_insert_count(self):
+        """Check the number of inserted rows"""
+        count = self.tbl.insert(self.idata)
+        assert count == len(self.idata)
+
+    def test_insert_chunks(self):
+        """Insert a list of lists in chunks"""
+        count = self.tbl.insert(self.idata, chunksize=3)
+        assert count == len(self.idata)
+        data = self.tbl.select()
+        assert self.check(self.idata, data)
+
+    def test_insert_atomic(self):
+        """Insert nothing if any of the values are invalid"""
+        values = list(self.idata) + [self.idata[0][:-2]]
+        try:
+            self.tbl.insert(values)
+        except ValueError:
+            pass
+        else:
+            assert False
+        data = self.tbl.select()
+        assert len(data) == 0
+
     def test_select_columns(self):
         """Make sure columns of selected data are correct"""
         self.insert()
         data = self.tbl.select()
         assert tuple(data.columns) == self.tbl.columns
 
+    def test_select_chunks(self):
+        """Select data in chunks"""
+        self.insert()
+        chunks = list(self.tbl.select(chunksize=3))
+        assert [len(chunk) for chunk in chunks] == [3, 1]
+        assert self.check_data(self.idata[:3], chunks[0])
+        assert self.check_data(self.idata[3:], chunks[1])
+
+    def test_select_chunks_where(self):
+        """Select data in chunks with a WHERE argument"""
+        self.insert()
+        chunks = list(self.tbl.select(where=("age>?", 24), chunksize=2))
+        assert [len(chunk) for chunk in chunks] == [2, 1]
+
+    def test_select_parallel(self):
+        """Select data in parallel"""
+        self.insert()
+        data = self.tbl.select_parallel(n_workers=3)
+        assert self.check(self.idata, data)
+
+    def test_select_parallel_where(self):
+        """Select data in parallel with a WHERE argument"""
+        self.insert()
+        data = self.tbl.select_parallel(
+            where=("age=? OR age=?", (25, 24)), n_workers=2)
+        assert self.check(self.idata[[0, 1]], data), data
+
+    def test_pages(self):
+        """Page through the data in order"""
+        self.insert()
+        pages = self.tbl.pages('age', 3)
+        first = next(pages)
+        assert list(first['age']) == [24, 25, 26], first
+        assert list(first.columns) == list(self.tbl.select().columns)
+        rest = list(self.tbl.pages('age', 3, cursor=pages.cursor))
+        assert [list(page['age']) for page in rest] == [[29]], rest
+        rest = list(pages)
+        assert [list(page['age']) for page in rest] == [[29]], rest
+        assert list(pages) == []
+
+    def test_pages_where(self):
+        """Page through the data with a WHERE argument, in descending order"""
+        self.insert()
+        pages = self.tbl.pages(
+            ['height'], 1, where=("age>?", 24), columns='name',
+            descending=True)
+        names = [list(page['name']) for page in pages]
+        assert names == [['Louis Reasoner'], ['Eva Lu Ator'],
+                         ['Alyssa P. Hacker']], names
+
+    def test_count(self):
+        """Count the rows, with and without a WHERE argument"""
+        assert len(self.tbl) == 0
+        assert bool(self.tbl)
+        self.insert()
+        assert self.tbl.count() == 4
+        assert len(self.tbl) == 4
+        assert self.tbl.count(where=("age>?", 24)) == 3
+
+    def test_aggregate(self):
+        """Aggregate columns"""
+        self.insert()
+        data = self.tbl.aggregate(
+            {'age': 'mean', 'height': ['min', 'max']}, where="age<29")
+        assert list(data.columns) == ['age', 'height_min', 'height_max']
+        assert data['age'][0] == 25.0
+        assert data['height_min'][0] == 66.25
+        assert data['height_max'][0] == 70.1
+
     def test_select_where_args(self):
         """Check where selection with one argument"""
         self.insert()
@@ -201,6 +296,36 @@ class TestTable(object):
             dtype='object')
         assert self.check(idata, data)
 
+    def test_insert_columns(self):
+        """Insert a dictionary of columns"""
+        count = self.tbl.insert({
+            'id': np.array([1, 2]),
+            'name': ['Alyssa P. Hacker', 'Ben Bitdiddle'],
+            'age': np.array([25, 24], dtype=np.int32),
+            'height': np.array([66.25, 70.1])})
+        assert count == 2
+        data = self.tbl.select()
+        idata = np.array([
+            [1, 'Alyssa P. Hacker', 25, 66.25],
+            [2, 'Ben Bitdiddle', 24, 70.1]],
+            dtype='object')
+        assert self.check(idata, data)
+
+    def test_insert_structured_array(self):
+        """Insert a structured array"""
+        arr = np.array(
+            [(1, 'Alyssa P. Hacker', 25, 66.25),
+             (2, 'Ben Bitdiddle', 24, 70.1)],
+            dtype=[('id', int), ('name', 'U20'), ('age', int),
+                   ('height', float)])
+        self.tbl.insert(arr)
+        data = self.tbl.select()
+        idata = np.array([
+            [1, 'Alyssa P. Hacker', 25, 66.25],
+            [2, 'Ben Bitdiddle', 24, 70.1]],
+            dtype='object')
+        assert self.check(idata, data)
+
     def test_slice_name(self):
         """Slice the 'name' column"""
         self.insert()
@@ -307,8 +432,115 @@ class TestTable(object):
         data = self.tbl.select()
         assert self.check_data(self.idata[:0], data)
 
+    def test_parquet(self):
+        """Write and read a parquet file"""
+        try:
+            import pyarrow
+        except ImportError:
+            raise SkipTest("pyarrow is not installed")
+        self.insert()
+        count = self.tbl.to_parquet("test.parquet", chunksize=3)
+        assert count == len(self.idata)
+        tbl = Table.from_parquet(
+            DBNAME, "Foo_2", "test.parquet",
+            primary_key=self.tbl.primary_key,
+            autoincrement=self.tbl.autoincrement)
+        os.remove("test.parquet")
+        assert repr(tbl) == repr(self.tbl).replace("Foo", "Foo_2")
+        data = tbl.select()
+        assert self.check(self.idata, data)
+
+    def test_iter_batches(self):
+        """Select data as Arrow record batches"""
+        try:
+            import pyarrow
+        except ImportError:
+            raise SkipTest("pyarrow is not installed")
+        self.insert()
+        batches = list(self.tbl.iter_batches(
+            columns=['name', 'height'], chunksize=3))
+        assert [batch.num_rows for batch in batches] == [3, 1]
+        names = batches[0].schema.names
+        assert names[-2:] == ['name', 'height']
+        assert batches[0].column(names.index('name')).to_pylist() == list(
+            self.idata[:3, -3])
+
+    def test_transaction(self):
+        """Commit several operations in one transaction"""
+        with self.tbl.transaction():
+            self.tbl.insert(self.idata[:2])
+            self.tbl.insert(self.idata[2:])
+            data = self.tbl.select()
+            assert self.check(self.idata, data)
+        data = self.tbl.select()
+        assert self.check(self.idata, data)
+
+    def test_transaction_rollback(self):
+        """Roll back a transaction that raises an exception"""
+        self.insert()
+        try:
+            with self.tbl.transaction():
+                self.tbl.delete()
+                self.tbl.insert(self.idata[:1])
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        data = self.tbl.select()
+        assert self.check(self.idata, data)
+
+    def test_transaction_nested(self):
+        """Merge nested transactions into the outermost one"""
+        try:
+            with self.tbl.transaction():
+                with transaction(DBNAME):
+                    self.insert()
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        data = self.tbl.select()
+        assert len(data) == 0
+
     def test_csv(self):
         """Write a csv file"""
         self.insert()
         self.tbl.save_csv("test.csv")
         os.remove("test.csv")
+
+    def test_csv_chunks(self):
+        """Write a gzipped csv file in chunks"""
+        self.insert()
+        counts = []
+        count = self.tbl.save_csv(
+            "test.csv.gz", chunksize=3, progress=counts.append)
+        assert count == len(self.idata)
+        assert counts == [3, 4]
+        with gzip.open("test.csv.gz", "rt") as f:
+            lines = f.read().splitlines()
+        os.remove("test.csv.gz")
+        assert lines[0] == ",".join(self.tbl.columns)
+        assert len(lines) == len(self.idata) + 1
+
+    def test_load_csv(self):
+        """Load a csv file"""
+        self.insert()
+        self.tbl.save_csv("test.csv")
+        self.tbl.delete()
+        count = self.tbl.load_csv(
+            "test.csv", chunksize=3, synchronous='OFF')
+        os.remove("test.csv")
+        assert count == len(self.idata)
+        data = self.tbl.select()
+        assert self.check(self.idata, data)
+
+    def test_create_from_csv(self):
+        """Create a table from a csv file"""
+        self.insert()
+        self.tbl.save_csv("test.csv.gz")
+        tbl = Table.create_from_csv(
+            DBNAME, "Foo_2", "test.csv.gz",
+            primary_key=self.tbl.primary_key,
+            autoincrement=self.tbl.autoincrement)
+        os.remove("test.csv.gz")
+        assert repr(tbl) == repr(self.tbl).replace("Foo", "Foo_2")
+        data = tbl.select()
+        assert self.check(self.idata, data)
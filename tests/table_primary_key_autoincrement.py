@@ -109,6 +109,34 @@ class TestTablePrimaryKeyAutoincrement(TestTablePrimaryKey):
             dtype='object')
         assert self.check(idata, data)
 
+    def test_insert_columns(self):
+        """Insert a dictionary of columns"""
+        count = self.tbl.insert({
+            'name': ['Alyssa P. Hacker', 'Ben Bitdiddle'],
+            'age': np.array([25, 24], dtype=np.int32),
+            'height': np.array([66.25, 70.1])})
+        assert count == 2
+        data = self.tbl.select()
+        idata = np.array([
+            ['Alyssa P. Hacker', 25, 66.25],
+            ['Ben Bitdiddle', 24, 70.1]],
+            dtype='object')
+        assert self.check(idata, data)
+
+    def test_insert_structured_array(self):
+        """Insert a structured array"""
+        arr = np.array(
+            [('Alyssa P. Hacker', 25, 66.25),
+             ('Ben Bitdiddle', 24, 70.1)],
+            dtype=[('name', 'U20'), ('age', int), ('height', float)])
+        self.tbl.insert(arr)
+        data = self.tbl.select()
+        idata = np.array([
+            ['Alyssa P. Hacker', 25, 66.25],
+            ['Ben Bitdiddle', 24, 70.1]],
+            dtype='object')
+        assert self.check(idata, data)
+
     def test_index_0(self):
         """Index the zeroth row"""
         self.insert()
@@ -0,0 +1,114 @@
+import asyncio
+import os
+import threading
+
+from dbtools import AsyncTable, Table
+from . import DBNAME
+
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def test_async_insert_select():
+    """Check that rows can be inserted and selected asynchronously"""
+    Table.create(DBNAME, "foo", [('id', int), ('name', str)])
+    tbl = AsyncTable(DBNAME, "foo")
+
+    async def main():
+        count = await tbl.insert([[1, 'a'], [2, 'b']])
+        data = await tbl.select(where="id>1")
+        assert await tbl.count() == 2
+        return count, data
+
+    count, data = run(main())
+    assert count == 2, count
+    assert list(data['name']) == ['b'], data
+    os.remove(DBNAME)
+
+
+def test_async_coalesced_writes():
+    """Check that concurrent writes are all applied in order"""
+    Table.create(DBNAME, "foo", [('id', int), ('name', str)])
+    tbl = AsyncTable(DBNAME, "foo")
+
+    async def main():
+        writes = [tbl.insert([i, str(i)]) for i in range(50)]
+        writes.append(tbl.update({'name': 'x'}, where="id<10"))
+        writes.append(tbl.delete(where="id>=40"))
+        results = await asyncio.gather(*writes)
+        return results, await tbl.select()
+
+    results, data = run(main())
+    assert results[:50] == [1] * 50, results
+    assert list(data['id']) == list(range(40)), data
+    assert list(data['name'][:10]) == ['x'] * 10, data
+    assert list(data['name'][10:]) == [str(i) for i in range(10, 40)], data
+    os.remove(DBNAME)
+
+
+def test_async_coalesced_error():
+    """Check that a failing write does not affect the writes batched with it"""
+    Table.create(DBNAME, "foo", [('id', int)], primary_key='id')
+    tbl = AsyncTable(DBNAME, "foo")
+
+    async def main():
+        writes = [tbl.insert([1]), tbl.insert([1]), tbl.insert([2])]
+        results = await asyncio.gather(*writes, return_exceptions=True)
+        return results, await tbl.select()
+
+    results, data = run(main())
+    assert results[0] == 1, results
+    assert isinstance(results[1], Exception), results
+    assert results[2] == 1, results
+    assert list(data.index) == [1, 2], data
+    os.remove(DBNAME)
+
+
+def test_async_cancelled_write():
+    """Check that a write that is cancelled while queued is not run"""
+    Table.create(DBNAME, "foo", [('id', int)])
+    tbl = AsyncTable(DBNAME, "foo")
+    worker = tbl._worker
+
+    # hold up the worker, so that the writes are queued behind each other
+    event = threading.Event()
+    worker.submit(event.wait, (), {}, False)
+    first = worker.submit(tbl.table.insert, ([1],), {}, True)
+    second = worker.submit(tbl.table.insert, ([2],), {}, True)
+    third = worker.submit(tbl.table.insert, ([3],), {}, True)
+    assert second.cancel()
+    event.set()
+    assert first.result() == 1
+    assert third.result() == 1
+    assert list(tbl.table.select()['id']) == [1, 3]
+    os.remove(DBNAME)
+
+
+def test_async_coalesced_savepoints():
+    """Check that a failing write is rolled back without re-running the others"""
+    Table.create(DBNAME, "foo", [('id', int), ('name', str)],
+                 primary_key='id')
+    tbl = AsyncTable(DBNAME, "foo")
+    tbl.table.insert([[1, 'a'], [2, 'b']])
+    worker = tbl._worker
+
+    # hold up the worker, so that the writes are queued behind each other
+    event = threading.Event()
+    worker.submit(event.wait, (), {}, False)
+    values = ({'id': i, 'name': 'x'} for i in (1, 2))
+    first = worker.submit(tbl.table.update_many, (values,), {}, True)
+    second = worker.submit(tbl.table.insert, ([[3, 'c'], [1, 'd']],), {}, True)
+    third = worker.submit(tbl.table.insert, ([4, 'e'],), {}, True)
+    event.set()
+    assert first.result() == 2
+    assert isinstance(second.exception(), Exception)
+    assert third.result() == 1
+    data = tbl.table.select()
+    assert list(data.index) == [1, 2, 4], data
+    assert list(data['name']) == ['x', 'x', 'e'], data
+    os.remove(DBNAME)
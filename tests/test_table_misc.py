@@ -1,6 +1,13 @@
+import numpy as np
 import os
+import pandas as pd
+import time
 
-from dbtools import Table
+from nose.plugins.skip import SkipTest
+from sqlite3 import IntegrityError, OperationalError
+
+from dbtools import Table, close_pools, transaction
+from dbtools.util import get_schema, get_query_cache, get_pool, sql_execute
 from . import DBNAME
 
 
@@ -33,3 +40,704 @@ def test_list_tables():
     assert tables == ["foo", "bar"], tables
     assert Table.exists(DBNAME, 'foo', verbose=True)
     os.remove(DBNAME)
+
+
+def test_create_from_dataframe_dtypes():
+    """Check column types inferred from dataframe dtypes"""
+    df = pd.DataFrame({
+        'name': ['apple', None, 'cucumber'],
+        'weight': [1.5, np.nan, 0.25],
+        'count': np.array([3, 1, 2], dtype='int32'),
+        'fruit': [True, True, False]})
+    tbl = Table.create(DBNAME, "foo", df, verbose=True)
+    assert repr(tbl) == (
+        "foo(name TEXT, weight REAL, count INTEGER, fruit INTEGER)")
+    data = tbl.select()
+    assert list(pd.isnull(data['name'])) == [False, True, False]
+    assert list(pd.isnull(data['weight'])) == [False, True, False]
+    assert list(data['count']) == [3, 1, 2]
+    assert list(data['fruit']) == [1, 1, 0]
+    os.remove(DBNAME)
+
+
+def test_create_from_dataframe_mixed():
+    """Check all the values of object columns in a dataframe"""
+    df = pd.DataFrame({'x': pd.Series([1, 2.5, None], dtype=object)})
+    tbl = Table.create(DBNAME, "foo", df)
+    assert repr(tbl) == "foo(x REAL)", repr(tbl)
+    tbl.drop()
+    df = pd.DataFrame({'x': pd.Series([1, 'x'], dtype=object)})
+    try:
+        Table.create(DBNAME, "foo", df)
+    except ValueError:
+        pass
+    else:
+        assert False
+    assert not Table.exists(DBNAME, "foo")
+    os.remove(DBNAME)
+
+
+def test_create_from_dataframe_index():
+    """Create a table with a primary key from a dataframe index"""
+    df = pd.DataFrame({'age': [25, 24]},
+                      index=pd.Index([3, 7], name='id'))
+    tbl = Table.create(DBNAME, "foo", df, verbose=True)
+    assert tbl.primary_key == 'id'
+    data = tbl.select()
+    assert list(data.index) == [3, 7]
+    assert list(data['age']) == [25, 24]
+    os.remove(DBNAME)
+
+
+def test_schema_cache():
+    """Reuse the cached schema until it changes"""
+    Table.create(DBNAME, "foo", [('id', int)], verbose=True)
+    schema = get_schema(DBNAME)
+    Table(DBNAME, "foo")
+    assert get_schema(DBNAME) is schema
+    Table.create(DBNAME, "bar", [('id', int)], verbose=True)
+    assert get_schema(DBNAME) is not schema
+    assert Table.list_tables(DBNAME) == ["foo", "bar"]
+    os.remove(DBNAME)
+
+
+def test_schema_cache_replaced_db():
+    """Do not reuse the cached schema of a removed database"""
+    Table.create(DBNAME, "foo", [('id', int)], verbose=True)
+    os.remove(DBNAME)
+    tbl = Table.create(DBNAME, "foo", [('id', int), ('age', int)])
+    assert tbl.columns == ('id', 'age')
+    assert Table(DBNAME, "foo").columns == ('id', 'age')
+    os.remove(DBNAME)
+
+
+def test_column_info():
+    """Get column information for a table with constraints"""
+    sql_execute(DBNAME, (
+        "CREATE TABLE foo(id INTEGER PRIMARY KEY AUTOINCREMENT, "
+        "name VARCHAR(10, 2) NOT NULL DEFAULT 'a, b', age INTEGER, "
+        "CHECK (age > 0))"))
+    tbl = Table(DBNAME, "foo")
+    assert tbl.columns == ('id', 'name', 'age')
+    assert tbl.primary_key == 'id'
+    assert tbl.autoincrement
+    name = tbl.column_info[1]
+    assert name.type == 'VARCHAR(10, 2)'
+    assert name.affinity == 'TEXT'
+    assert name.notnull
+    assert name.default == "'a, b'"
+    assert not name.primary_key
+    os.remove(DBNAME)
+
+
+def test_composite_primary_key():
+    """Open and select from a table with a composite primary key"""
+    sql_execute(DBNAME, (
+        "CREATE TABLE foo(a INTEGER, b TEXT, x REAL, PRIMARY KEY(a, b))"))
+    tbl = Table(DBNAME, "foo")
+    assert tbl.primary_key is None
+    flags = [col.primary_key for col in tbl.column_info]
+    assert [bool(flag) for flag in flags] == [True, True, False], flags
+    tbl.insert([[1, 'x', 0.5], [1, 'y', 1.5]])
+    data = tbl.select(where=("a=?", 1))
+    assert list(data['b']) == ['x', 'y'], data
+    assert list(data['x']) == [0.5, 1.5], data
+    os.remove(DBNAME)
+
+
+def test_indexes():
+    """Create, list and drop indexes"""
+    tbl = Table.create(
+        DBNAME, "foo", [('id', int), ('name', str), ('age', int)],
+        primary_key='id')
+    name = tbl.create_index('name')
+    assert name == 'idx_foo_name'
+    tbl.create_index(['name', 'age'], unique=True, name='foo_name_age')
+    indexes = tbl.list_indexes()
+    assert indexes == {
+        'idx_foo_name': ('name',),
+        'foo_name_age': ('name', 'age')}
+    tbl.drop_index(name)
+    assert list(tbl.list_indexes().keys()) == ['foo_name_age']
+    os.remove(DBNAME)
+
+
+def test_suggest_indexes():
+    """Suggest indexes for WHERE clauses that scan the table"""
+    Table.create(
+        DBNAME, "foo", [('id', int), ('name', str), ('age', int)],
+        primary_key='id')
+    tbl = Table(DBNAME, "foo", advise=True)
+    tbl.select(where=("age=? AND name!='age'", 25))
+    tbl.select(where=("age=? AND name!='age'", 26))
+    tbl.select(where="id=3")
+    tbl.delete(where="name='Ben Bitdiddle'")
+    suggestions = tbl.suggest_indexes()
+    assert list(suggestions['count']) == [2, 1]
+    assert list(suggestions['columns']) == [('age', 'name'), ('name',)]
+    tbl.create_index('age')
+    suggestions = tbl.suggest_indexes()
+    assert list(suggestions['columns']) == [('name',)]
+    os.remove(DBNAME)
+
+
+def test_upsert():
+    """Insert or update rows by primary key"""
+    tbl = Table.create(
+        DBNAME, "foo", [('id', int), ('name', str), ('age', int)],
+        primary_key='id')
+    tbl.insert([[1, 'Alyssa P. Hacker', 25], [2, 'Ben Bitdiddle', 24]])
+    count = tbl.upsert([
+        {'id': 2, 'age': 30},
+        {'id': 3, 'name': 'Eva Lu Ator', 'age': 29},
+        {'id': 1, 'age': 26}])
+    assert count == 3
+    data = tbl.select()
+    assert list(data.index) == [1, 2, 3]
+    assert list(data['name']) == [
+        'Alyssa P. Hacker', 'Ben Bitdiddle', 'Eva Lu Ator']
+    assert list(data['age']) == [26, 30, 29]
+    os.remove(DBNAME)
+
+
+def test_upsert_dataframe():
+    """Insert or update rows from a dataframe"""
+    tbl = Table.create(
+        DBNAME, "foo", [('id', int), ('name', str), ('age', int)],
+        primary_key='id')
+    tbl.insert([[1, 'Alyssa P. Hacker', 25]])
+    df = pd.DataFrame({'age': [26, 24]}, index=pd.Index([1, 2], name='id'))
+    assert tbl.upsert(df) == 2
+    data = tbl.select()
+    assert list(data['age']) == [26, 24]
+    assert list(pd.isnull(data['name'])) == [False, True]
+    os.remove(DBNAME)
+
+
+def test_upsert_no_primary_key():
+    """Fail to upsert rows without a primary key"""
+    tbl = Table.create(DBNAME, "foo", [('id', int), ('age', int)],
+                       primary_key='id')
+    try:
+        tbl.upsert([{'id': 1, 'age': 25}, {'age': 26}])
+    except ValueError:
+        pass
+    else:
+        assert False
+    assert len(tbl.select()) == 0
+    os.remove(DBNAME)
+
+
+def test_update_many():
+    """Update many rows with different values"""
+    tbl = Table.create(
+        DBNAME, "foo", [('id', int), ('name', str), ('age', int)],
+        primary_key='id')
+    tbl.insert([[1, 'Alyssa P. Hacker', 25], [2, 'Ben Bitdiddle', 24],
+                [3, 'Eva Lu Ator', 29]])
+    count = tbl.update_many([{'id': 1, 'age': 26}, {'id': 3, 'age': 30},
+                             {'id': 4, 'age': 0}])
+    assert count == 2
+    data = tbl.select()
+    assert list(data.index) == [1, 2, 3]
+    assert list(data['age']) == [26, 24, 30]
+    os.remove(DBNAME)
+
+
+def test_update_many_dataframe():
+    """Update many rows from a dataframe"""
+    tbl = Table.create(
+        DBNAME, "foo", [('id', int), ('name', str), ('age', int)],
+        primary_key='id')
+    tbl.insert([[1, 'Alyssa P. Hacker', 25], [2, 'Ben Bitdiddle', 24]])
+    data = tbl.select()
+    data['age'] = data['age'] + 1
+    assert tbl.update_many(data[['age']]) == 2
+    df = pd.DataFrame({'name': ['Ben Bitdiddle'], 'age': [0]})
+    assert tbl.update_many(df, key='name') == 1
+    data = tbl.select()
+    assert list(data['age']) == [26, 0]
+    os.remove(DBNAME)
+
+
+def test_profile():
+    """Apply a performance profile to connections"""
+    tbl = Table.create(DBNAME, "foo", [('id', int)], profile='performance')
+    tbl.insert([[1], [2]])
+    mode = sql_execute(DBNAME, "PRAGMA journal_mode", fetchall=True)
+    assert mode[0][0] == 'wal'
+    sync = sql_execute(DBNAME, "PRAGMA synchronous", fetchall=True)
+    assert sync[0][0] == 1
+    Table(DBNAME, "foo", profile={'synchronous': 'FULL'})
+    sync = sql_execute(DBNAME, "PRAGMA synchronous", fetchall=True)
+    assert sync[0][0] == 2
+    with transaction(DBNAME):
+        Table(DBNAME, "foo", profile={'synchronous': 'OFF'})
+    sync = sql_execute(DBNAME, "PRAGMA synchronous", fetchall=True)
+    assert sync[0][0] == 0
+    ro = Table(DBNAME, "foo", readonly=True, profile='performance')
+    assert list(ro.select()['id']) == [1, 2]
+    # a read-only connection can't remove the WAL files, so it has to
+    # be closed before the last read-write connection
+    close_pools(ro.db)
+    close_pools()
+    os.remove(DBNAME)
+
+
+def test_readonly():
+    """Select from a read-only, memory-mapped table"""
+    tbl = Table.create(DBNAME, "foo", [('id', int), ('age', int)],
+                       primary_key='id')
+    tbl.insert([[1, 25], [2, 24]])
+    ro = Table(DBNAME, "foo", readonly=True, mmap=2 ** 20)
+    assert ro.db.startswith("file:") and ro.db.endswith("?mode=ro")
+    assert Table.exists(ro.db, "foo")
+    assert list(ro.select()['age']) == [25, 24]
+    tbl.insert([[3, 29]])
+    assert list(ro.select()['age']) == [25, 24, 29]
+    mmap = sql_execute(ro.db, "PRAGMA mmap_size", fetchall=True)
+    assert mmap[0][0] == 2 ** 20
+    # opening the table again with the same settings keeps the
+    # persistent connection
+    pool = get_pool(ro.db)
+    conn = pool._idle[-1][0]
+    Table(DBNAME, "foo", readonly=True, mmap=2 ** 20).select()
+    assert pool._idle[-1][0] is conn
+    Table(DBNAME, "foo", readonly=True, mmap=2 ** 20,
+          profile={'cache_size': -8192}).select()
+    conn = pool._idle[-1][0]
+    for i in range(3):
+        Table(DBNAME, "foo", readonly=True, mmap=2 ** 20,
+              profile={'cache_size': -8192}).select()
+        assert pool._idle[-1][0] is conn
+    try:
+        ro.insert([[4, 30]])
+    except OperationalError:
+        pass
+    else:
+        assert False
+    close_pools()
+    os.remove(DBNAME)
+
+
+def test_query_cache():
+    """Cache select results until the database changes"""
+    tbl = Table.create(DBNAME, "foo", [('id', int), ('age', int)],
+                       primary_key='id')
+    tbl.insert([[1, 25], [2, 24]])
+    cached = Table(DBNAME, "foo", cache={'max_entries': 2})
+    cache = get_query_cache(DBNAME)
+    data = cached.select(where=("age>?", [20]))
+    assert len(cache) == 1
+    data['age'] = 0
+    data = cached.select(where=("age>?", [20]))
+    assert list(data['age']) == [25, 24]
+    cached['age']
+    cached[1]
+    assert len(cache) == 2
+    tbl.update({'age': 30}, where="id=1")
+    assert list(cached.select()['age']) == [30, 24]
+    with tbl.transaction():
+        tbl.delete(where="id=1")
+        assert list(cached.select()['age']) == [24]
+    assert list(cached.select()['age']) == [24]
+    close_pools()
+    os.remove(DBNAME)
+
+
+def test_writer():
+    """Check that a writer inserts all of its rows when it is closed"""
+    tbl = Table.create(DBNAME, "foo", [('id', int), ('name', str)])
+    with tbl.writer(flush_rows=10, flush_interval=None) as writer:
+        for i in range(25):
+            writer.insert([i, str(i)])
+        writer.insert([{'id': 25, 'name': '25'}, {'id': 26}])
+    data = tbl.select()
+    assert list(data['id']) == list(range(27)), data
+    assert writer.table is tbl
+    os.remove(DBNAME)
+
+
+def test_writer_flush_interval():
+    """Check that a writer flushes its rows after the flush interval"""
+    tbl = Table.create(DBNAME, "foo", [('id', int)])
+    writer = tbl.writer(flush_rows=1000, flush_interval=0.05)
+    writer.insert([1])
+    for i in range(100):
+        if len(tbl.select()) > 0:
+            break
+        time.sleep(0.01)
+    assert list(tbl.select()['id']) == [1]
+    writer.close()
+    os.remove(DBNAME)
+
+
+def test_writer_error():
+    """Check that a writer raises errors from the background thread"""
+    tbl = Table.create(DBNAME, "foo", [('id', int)], primary_key='id')
+    writer = tbl.writer(flush_rows=1000, flush_interval=None)
+    writer.insert([[1], [1]])
+    try:
+        writer.flush()
+    except IntegrityError:
+        pass
+    else:
+        raise AssertionError("expected IntegrityError")
+    writer.insert([2])
+    writer.close()
+    assert list(tbl.select().index) == [2]
+    os.remove(DBNAME)
+
+
+def test_create_from_dicts_missing():
+    """Create a table from dicts with missing and None values"""
+    tbl = Table.create(DBNAME, "foo", [
+        {'id': 1, 'name': 'apple', 'weight': 1},
+        {'id': 2, 'weight': 0.5},
+        {'id': 3, 'name': None, 'weight': None}], primary_key='id')
+    assert [c.type for c in tbl.column_info if c.name == 'weight'] == ['REAL']
+    data = tbl.select()
+    assert list(data['weight'][:2]) == [1.0, 0.5], data
+    assert pd.isnull(data['name'][2]), data
+    os.remove(DBNAME)
+
+
+def test_create_from_dicts_sample():
+    """Create a table from dicts, inferring types from a sample"""
+    tbl = Table.create(DBNAME, "foo", [
+        {'id': 1, 'weight': 0.5},
+        {'id': 2, 'weight': 2},
+        {'id': 3, 'weight': True}], primary_key='id', sample=1)
+    assert list(tbl.select()['weight']) == [0.5, 2.0, 1.0]
+    os.remove(DBNAME)
+    for extra in ({'id': 2, 'weight': 'heavy'}, {'id': 2, 'size': 3}):
+        try:
+            Table.create(DBNAME, "foo", [{'id': 1, 'weight': 0.5}, extra],
+                         primary_key='id', sample=1)
+        except ValueError:
+            pass
+        else:
+            assert False
+        assert not Table.exists(DBNAME, "foo")
+
+
+def test_create_from_columns():
+    """Create a table from a dictionary of columns"""
+    tbl = Table.create(DBNAME, "foo", {
+        'name': ['apple', None, 'pear'],
+        'weight': np.array([1.5, 0.5, 2.0], dtype=np.float32),
+        'count': np.arange(3)}, primary_key='id')
+    assert tbl.columns == ('id', 'name', 'weight', 'count'), tbl.columns
+    affinities = [c.affinity for c in tbl.column_info]
+    assert affinities == ['INTEGER', 'TEXT', 'REAL', 'INTEGER'], affinities
+    data = tbl.select()
+    assert list(data.index) == [1, 2, 3]
+    assert list(data['count']) == [0, 1, 2]
+    assert pd.isnull(data['name'][2]), data
+    os.remove(DBNAME)
+
+
+def test_create_from_structured_array():
+    """Create a table from a structured array"""
+    arr = np.zeros(4, dtype=[('id', np.int64), ('x', np.float64),
+                             ('flag', np.bool_)])
+    arr['id'] = [2, 4, 6, 8]
+    arr['flag'] = [True, False, True, False]
+    tbl = Table.create(DBNAME, "foo", arr, primary_key='id')
+    data = tbl.select()
+    assert list(data.index) == [2, 4, 6, 8]
+    assert list(data['flag']) == [1, 0, 1, 0]
+    os.remove(DBNAME)
+
+
+def test_insert_bytearray():
+    """Insert a single row holding a bytearray into a blob column"""
+    tbl = Table.create(DBNAME, "foo", [('id', int), ('data', bytes)],
+                       primary_key='id')
+    tbl.insert({'data': bytearray(b'xy')})
+    tbl.insert({'data': memoryview(b'z')})
+    data = tbl.select()
+    assert list(data.index) == [1, 2], data
+    assert list(data['data']) == [b'xy', b'z'], data
+    os.remove(DBNAME)
+
+
+def test_insert_dataframe():
+    """Insert rows from a DataFrame, including its named index"""
+    tbl = Table.create(DBNAME, "foo", [('id', int), ('age', int),
+                                       ('name', str)], primary_key='id')
+    df = pd.DataFrame({'age': [25, 24], 'name': ['Alyssa', 'Ben']},
+                      index=pd.Index([3, 5], name='id'))
+    assert tbl.insert(df) == 2
+    tbl.insert(pd.DataFrame({'name': ['Cy']}))
+    data = tbl.select()
+    assert list(data.index) == [3, 5, 6], data
+    assert list(data['name']) == ['Alyssa', 'Ben', 'Cy'], data
+    assert pd.isnull(data['age'][6]), data
+    os.remove(DBNAME)
+
+
+def test_select_parallel_null_key():
+    """Select in parallel from a table whose primary key holds NULL"""
+    sql_execute(DBNAME, "CREATE TABLE foo(id BIGINT PRIMARY KEY, x INTEGER)")
+    tbl = Table(DBNAME, "foo")
+    tbl.insert([[None, 1], [None, 2], [3, 3], [7, 4]])
+    data = tbl.select_parallel(n_workers=2)
+    assert len(data) == 4, data
+    assert sorted(data['x']) == [1, 2, 3, 4], data
+    os.remove(DBNAME)
+
+
+def test_statement_cache():
+    """Memoize generated SQL statements until the schema changes"""
+    tbl = Table.create(DBNAME, "foo", [('id', int), ('age', int)],
+                       primary_key='id')
+    tbl.insert([[1, 25], [2, 24]])
+    tbl.select(where=("age>?", 20))
+    tbl.update({'age': 26}, where=("id=?", 1))
+    other = Table(DBNAME, "foo")
+    assert other._statements is tbl._statements
+    cmd = other._statement("SELECT", ['id', 'age'], " WHERE age>?")
+    assert cmd == "SELECT id,age FROM foo WHERE age>?", cmd
+    assert len(tbl._statements) == 3, tbl._statements
+    tbl.create_index('age')
+    other = Table(DBNAME, "foo")
+    assert len(other._statements) == 0
+    assert list(other.select()['age']) == [26, 24]
+    close_pools()
+    os.remove(DBNAME)
+
+
+def test_pages_cursor():
+    """Resume paging from a cursor, and reject mismatched cursors"""
+    tbl = Table.create(DBNAME, "foo", [('name', str), ('age', int)])
+    tbl.insert([['a', 3], ['b', 1], ['c', 3], ['d', 2]])
+    pages = tbl.pages('age', 2)
+    assert list(next(pages)['name']) == ['b', 'd']
+    token = pages.cursor
+    assert list(next(pages)['name']) == ['a', 'c']
+    resumed = tbl.pages('age', 2, cursor=token)
+    assert list(next(resumed)['name']) == ['a', 'c']
+    try:
+        tbl.pages('name', 2, cursor=token)
+    except ValueError:
+        pass
+    else:
+        assert False
+    os.remove(DBNAME)
+
+
+def test_aggregate_by():
+    """Aggregate columns in groups"""
+    tbl = Table.create(DBNAME, "foo", [('team', str), ('score', int)])
+    tbl.insert([['b', 3], ['a', 1], ['b', 5], ['a', None]])
+    data = tbl.aggregate({'score': ['count', 'sum', 'mean']}, by='team')
+    assert list(data.index) == ['a', 'b'], data
+    assert list(data['score_count']) == [1, 2], data
+    assert list(data['score_sum']) == [1, 8], data
+    assert list(data['score_mean']) == [1.0, 4.0], data
+    data = tbl.aggregate({'team': 'count'}, by='team')
+    assert list(data.index) == ['a', 'b'], data
+    assert list(data['team_count']) == [2, 2], data
+    assert tbl
+    for funcs in ({'score': 'median'}, {}, {'score': []}):
+        try:
+            tbl.aggregate(funcs)
+        except ValueError:
+            pass
+        else:
+            assert False
+    os.remove(DBNAME)
+
+
+def test_pages_null():
+    """Page on sort columns with NULL values"""
+    tbl = Table.create(DBNAME, "foo", [('id', int), ('u', int), ('v', int)],
+                       primary_key='id')
+    tbl.insert([[1, 1, 5], [2, None, None], [3, 1, 1], [4, 2, None],
+                [5, None, 7], [6, 1, None], [7, 2, 5]])
+    for descending in (False, True):
+        for size in (1, 2, 3):
+            expected = sql_execute(
+                DBNAME, "SELECT id FROM foo ORDER BY u%s, v%s, id%s" % (
+                    (" DESC" if descending else "",) * 3), fetchall=True)
+            expected = [row[0] for row in expected]
+            pages = tbl.pages(['u', 'v'], size, descending=descending)
+            ids = sum([list(page.index) for page in pages], [])
+            assert ids == expected, (descending, size, ids)
+
+            # resume from each cursor in turn
+            ids = []
+            cursor = None
+            while True:
+                pages = tbl.pages(['u', 'v'], size, descending=descending,
+                                  cursor=cursor)
+                page = next(pages, None)
+                if page is None:
+                    break
+                ids.extend(page.index)
+                cursor = pages.cursor
+            assert ids == expected, (descending, size, ids)
+    pages = tbl.pages('v', 2, where="v IS NOT NULL", descending=True)
+    ids = [list(page.index) for page in pages]
+    assert ids == [[5, 7], [1, 3]], ids
+    os.remove(DBNAME)
+
+
+def test_pages_composite_key_null():
+    """Page past NULLs in a column of a composite primary key"""
+    sql_execute(DBNAME, (
+        "CREATE TABLE foo(a INTEGER, b INTEGER, n INTEGER, "
+        "PRIMARY KEY(a, b))"))
+    tbl = Table(DBNAME, "foo")
+    tbl.insert([[None, 1, 1], [None, 2, 2], [1, 1, 3]])
+    pages = tbl.pages('a', 1)
+    assert sorted(n for page in pages for n in page['n']) == [1, 2, 3]
+    os.remove(DBNAME)
+
+
+def test_pages_blob():
+    """Resume paging from a cursor on a blob column"""
+    tbl = Table.create(DBNAME, "foo", [('key', bytes), ('n', int)])
+    tbl.insert([[b'\x02', 1], [b'\xff', 2], [b'\x00\x01', 3]])
+    pages = tbl.pages('key', 1)
+    assert list(next(pages)['n']) == [3]
+    resumed = tbl.pages('key', 1, cursor=pages.cursor)
+    assert [list(page['n']) for page in resumed] == [[1], [2]]
+    os.remove(DBNAME)
+
+
+def test_parquet_inferred_types():
+    """Infer Arrow types from the values, not only the declared types"""
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise SkipTest("pyarrow is not installed")
+    sql_execute(DBNAME, "CREATE TABLE foo(id INTEGER PRIMARY KEY, "
+                        "created DATETIME, n)")
+    tbl = Table(DBNAME, "foo")
+    tbl.insert([[1, None, 1], [2, '2020-01-01 10:00', 2],
+                [3, 20200101, 3]])
+    batches = list(tbl.iter_batches(chunksize=2))
+    schema = batches[0].schema
+    assert schema.field('created').type == pa.string(), schema
+    assert schema.field('n').type == pa.int64(), schema
+    assert batches[1].column(1).to_pylist() == ['20200101']
+    count = tbl.to_parquet("test.parquet", chunksize=2)
+    assert count == 3
+    copy = Table.from_parquet(DBNAME, "bar", "test.parquet")
+    os.remove("test.parquet")
+    data = copy.select()
+    assert list(data['created'][1:]) == ['2020-01-01 10:00', '20200101']
+    assert list(data['n']) == [1, 2, 3]
+    close_pools()
+    os.remove(DBNAME)
+
+
+def test_parquet_mixed_batches():
+    """Infer Arrow types from every batch, not only the first one"""
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise SkipTest("pyarrow is not installed")
+    sql_execute(DBNAME, "CREATE TABLE foo(id INTEGER PRIMARY KEY, "
+                        "x NUMERIC, y, z BLOB)")
+    tbl = Table(DBNAME, "foo")
+    tbl.insert([[1, 10, None, None], [2, 12, None, None],
+                [3, 12.5, 'a', None], [4, 3, 5, None]])
+    schema = list(tbl.iter_batches(chunksize=2))[0].schema
+    assert schema.field('x').type == pa.float64(), schema
+    assert schema.field('y').type == pa.string(), schema
+    assert schema.field('z').type == pa.binary(), schema
+    count = tbl.to_parquet("test.parquet", chunksize=2)
+    assert count == 4
+    copy = Table.from_parquet(DBNAME, "bar", "test.parquet")
+    os.remove("test.parquet")
+    data = copy.select()
+    assert list(data['x']) == [10, 12, 12.5, 3]
+    assert list(data['y'][2:]) == ['a', '5']
+    close_pools()
+    os.remove(DBNAME)
+
+
+def test_save_csv_chunksize():
+    """Reject an invalid chunk size when saving a CSV file"""
+    tbl = Table.create(DBNAME, "foo", [('id', int)])
+    try:
+        tbl.save_csv("test.csv", chunksize=0)
+    except ValueError:
+        pass
+    else:
+        assert False
+    assert not os.path.exists("test.csv")
+    os.remove(DBNAME)
+
+
+def test_load_csv_chunksize():
+    """Reject an invalid chunk size when loading a CSV file"""
+    tbl = Table.create(DBNAME, "foo", [('id', int)])
+    tbl.insert([[1], [2]])
+    tbl.save_csv("test.csv")
+    for load in (lambda: tbl.load_csv("test.csv", chunksize=0),
+                 lambda: Table.create_from_csv(
+                     DBNAME, "bar", "test.csv", chunksize=0)):
+        try:
+            load()
+        except ValueError:
+            pass
+        else:
+            assert False
+    assert not Table.exists(DBNAME, "bar")
+    assert len(tbl) == 2
+    os.remove("test.csv")
+    os.remove(DBNAME)
+
+
+def test_load_csv_empty():
+    """Reject a CSV file without a header row"""
+    tbl = Table.create(DBNAME, "foo", [('id', int)])
+    open("test.csv", "w").close()
+    for load in (lambda: tbl.load_csv("test.csv"),
+                 lambda: Table.create_from_csv(DBNAME, "bar", "test.csv")):
+        try:
+            load()
+        except ValueError:
+            pass
+        else:
+            assert False
+    assert not Table.exists(DBNAME, "bar")
+    os.remove("test.csv")
+    os.remove(DBNAME)
+
+
+def test_select_chunks_write_in_transaction():
+    """Write while reading in chunks, sharing one transaction"""
+    tbl = Table.create(DBNAME, "foo", [('id', int), ('x', int)],
+                       primary_key='id')
+    tbl.insert([[i] for i in range(20)])
+    sums = Table.create(DBNAME, "bar", [('total', int)])
+    with tbl.transaction():
+        for chunk in tbl.select(chunksize=10):
+            sums.insert([[int(chunk['x'].sum())]])
+    assert list(sums.select()['total']) == [45, 145]
+    os.remove(DBNAME)
+
+
+def test_create_from_csv_mismatch():
+    """Don't leave a table behind if the CSV file doesn't match it"""
+    tbl = Table.create(DBNAME, "foo", [('id', int), ('age', int)])
+    tbl.insert([[1, 25], [2, 24]])
+    tbl.save_csv("test.csv")
+    try:
+        Table.create_from_csv(DBNAME, "bar", "test.csv",
+                              dtypes=[('id', int), ('weight', float)])
+    except ValueError:
+        pass
+    else:
+        assert False
+    assert not Table.exists(DBNAME, "bar")
+    bar = Table.create_from_csv(DBNAME, "bar", "test.csv",
+                                journal_mode='MEMORY')
+    assert list(bar.select()['age']) == [25, 24]
+    os.remove("test.csv")
+    os.remove(DBNAME)
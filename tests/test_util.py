@@ -1,6 +1,16 @@
+import numpy as np
+import os
+import pandas as pd
+import time
+
+from nose.plugins.skip import SkipTest
 from nose.tools import raises
 
-from dbtools.util import dict_to_dtypes
+from dbtools.util import dict_to_dtypes, ConnectionPool, get_pool, close_pools
+from dbtools.util import dicts_to_rows
+from dbtools.util import type_affinity, rows_to_frame, transaction, text_to_dtypes
+from dbtools.util import arrow_schema, rows_to_batch, require_sqlite
+from . import DBNAME
 
 
 def test_dict_to_dtypes_1():
@@ -47,3 +57,250 @@ def test_dict_to_dtypes_5():
          {'name': None, 'fruit': True, 'tree': False},
          {'name': None, 'fruit': None, 'tree': False}]
     dict_to_dtypes(d)
+
+
+def test_dict_to_dtypes_widen():
+    """Widen numeric dtypes when converting dicts"""
+    d = [{'a': 1, 'b': True, 'c': np.int64(3)},
+         {'a': 2.5, 'b': 2, 'c': None},
+         {'b': None}]
+    dtypes = dict_to_dtypes(d)
+    assert dtypes == [('a', float), ('b', int), ('c', int)], dtypes
+
+
+def test_dict_to_dtypes_sample():
+    """Only look at a sample of the dicts"""
+    d = [{'name': 'apple'}, {'name': 3}]
+    dtypes = dict_to_dtypes(d, sample=1)
+    assert dtypes == [('name', str)], dtypes
+
+
+def test_dict_to_dtypes_rows():
+    """Convert dicts to rows with the inferred schema"""
+    d = [{'name': 'apple', 'weight': np.float64(0.5)},
+         {'name': 'tomato'}]
+    schema = dict_to_dtypes(d)
+    assert schema.names == ['name', 'weight']
+    rows = schema.rows(d)
+    assert rows == [('apple', 0.5), ('tomato', None)], rows
+    assert type(rows[0][1]) is float
+
+
+def test_dict_to_dtypes_rows_check():
+    """Reject dicts that do not fit the inferred schema"""
+    schema = dict_to_dtypes([{'a': 1.5, 'b': 'x'}])
+    assert schema.rows([{'a': 1, 'b': None}]) == [(1, None)]
+    for record in ({'a': 'x'}, {'b': 2}, {'c': 1}):
+        try:
+            schema.rows([record])
+        except ValueError:
+            pass
+        else:
+            assert False, record
+
+
+def test_dicts_to_rows():
+    """Infer a schema from a sample of dicts and convert them all"""
+    d = [{'a': 1.5, 'b': 'x'}, {'a': np.int64(2)}]
+    schema, rows = dicts_to_rows(d, sample=1)
+    assert schema == [('a', float), ('b', str)], schema
+    assert rows == [(1.5, 'x'), (2, None)], rows
+    assert type(rows[1][0]) is int
+    try:
+        dicts_to_rows(d + [{'a': 1, 'c': 2}], sample=1)
+    except ValueError:
+        pass
+    else:
+        assert False
+
+
+def test_pool_reuses_connection():
+    """Reuse pooled connections"""
+    pool = ConnectionPool(DBNAME)
+    conn = pool.acquire()
+    pool.release(conn)
+    assert pool.acquire() is conn
+    pool.release(conn)
+    pool.close()
+    os.remove(DBNAME)
+
+
+def test_pool_max_size():
+    """Keep at most `max_size` idle connections"""
+    pool = ConnectionPool(DBNAME, max_size=1)
+    conn1 = pool.acquire()
+    conn2 = pool.acquire()
+    assert conn1 is not conn2
+    pool.release(conn1)
+    pool.release(conn2)
+    assert len(pool._idle) == 1
+    pool.close()
+    os.remove(DBNAME)
+
+
+def test_pool_pragmas_in_use():
+    """Don't reuse connections that were in use when the pragmas changed"""
+    pool = ConnectionPool(DBNAME)
+    conn = pool.acquire()
+    pool.set_pragmas({'synchronous': 'OFF'})
+    pool.release(conn)
+    assert len(pool._idle) == 0
+    conn = pool.acquire()
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 0
+    pool.release(conn)
+    pool.close()
+    os.remove(DBNAME)
+
+
+def test_pool_idle_timeout():
+    """Close connections that have been idle too long"""
+    pool = ConnectionPool(DBNAME, idle_timeout=0)
+    conn = pool.acquire()
+    pool.release(conn)
+    time.sleep(0.01)
+    assert pool.acquire() is not conn
+    pool.close()
+    os.remove(DBNAME)
+
+
+def test_pool_replaced_file():
+    """Discard pooled connections to a removed database file"""
+    pool = ConnectionPool(DBNAME)
+    conn = pool.acquire()
+    pool.release(conn)
+    os.remove(DBNAME)
+    assert pool.acquire() is not conn
+    pool.close()
+    os.remove(DBNAME)
+
+
+@raises(ValueError)
+def test_pool_closed():
+    """Fail to acquire a connection from a closed pool"""
+    pool = ConnectionPool(DBNAME)
+    pool.close()
+    pool.acquire()
+
+
+def test_pool_fork():
+    """Open new connections in a forked process"""
+    if not hasattr(os, 'fork'):
+        raise SkipTest("os.fork is not available")
+    pool = get_pool(DBNAME)
+    with pool.connection() as conn:
+        conn.execute("CREATE TABLE foo(x)")
+    pid = os.fork()
+    if pid == 0:
+        # in the child, which must not touch the parent's connection
+        status = 1
+        try:
+            child = get_pool(DBNAME)
+            with child.connection() as c:
+                c.execute("INSERT INTO foo VALUES (1)")
+                c.commit()
+            if child is not pool and c is not conn and pool.closed:
+                status = 0
+        finally:
+            os._exit(status)
+    assert os.waitpid(pid, 0)[1] == 0
+    assert get_pool(DBNAME) is pool
+    with pool.connection() as c:
+        assert c is conn
+        assert c.execute("SELECT x FROM foo").fetchall() == [(1,)]
+    close_pools()
+    os.remove(DBNAME)
+
+
+def test_get_pool():
+    """Share one pool per database"""
+    pool = get_pool(DBNAME)
+    assert get_pool(DBNAME) is pool
+    close_pools(DBNAME)
+    assert pool.closed
+    assert get_pool(DBNAME) is not pool
+    close_pools()
+
+
+def test_type_affinity():
+    """Determine type affinities from declared types"""
+    assert type_affinity("INTEGER") == "INTEGER"
+    assert type_affinity("bigint") == "INTEGER"
+    assert type_affinity("VARCHAR(10)") == "TEXT"
+    assert type_affinity("") == "BLOB"
+    assert type_affinity("DOUBLE") == "REAL"
+    assert type_affinity("NULL") == "NUMERIC"
+
+
+def test_rows_to_frame():
+    """Build a dataframe from rows with typed columns"""
+    rows = [(1, 'apple', 3, 1.5), (2, None, None, None), (3, 'pear', 2, 0.5)]
+    data = rows_to_frame(
+        rows, ['id', 'name', 'count', 'weight'],
+        ['INTEGER', 'TEXT', 'INTEGER', 'REAL'], index='id')
+    assert list(data.columns) == ['name', 'count', 'weight']
+    assert list(data.index) == [1, 2, 3]
+    assert data.index.name == 'id'
+    assert data['count'].dtype == np.float64
+    assert data['weight'].dtype == np.float64
+    assert list(pd.isnull(data['name'])) == [False, True, False]
+
+
+def test_rows_to_frame_fallback():
+    """Use object columns for values that do not match the affinity"""
+    rows = [(1, 2.5), ('a', 2 ** 70)]
+    data = rows_to_frame(rows, ['x', 'y'], ['INTEGER', 'REAL'])
+    assert list(data['x']) == [1, 'a']
+    assert data['y'].dtype == np.float64
+    data = rows_to_frame([(2 ** 70,), (1,)], ['x'], ['INTEGER'])
+    assert list(data['x']) == [2 ** 70, 1]
+
+
+def test_rows_to_frame_empty():
+    """Build an empty dataframe with typed columns"""
+    data = rows_to_frame([], ['x', 'y'], ['INTEGER', 'TEXT'])
+    assert len(data) == 0
+    assert data['x'].dtype == np.int64
+
+
+def test_rows_to_batch_lossy():
+    """Refuse to truncate floats in integer Arrow columns"""
+    try:
+        import pyarrow
+    except ImportError:
+        raise SkipTest("pyarrow is not installed")
+    schema = arrow_schema(['x'], ['INTEGER'], types=[set(['integer'])])
+    batch = rows_to_batch([(1,), (2.0,)], schema)
+    assert batch.column(0).to_pylist() == [1, 2]
+    try:
+        rows_to_batch([(1,), (2.5,)], schema)
+    except ValueError:
+        pass
+    else:
+        assert False
+
+
+def test_require_sqlite():
+    """Raise a clear error if SQLite is too old for a feature"""
+    require_sqlite((3, 0, 0), "anything")
+    try:
+        require_sqlite((99, 0, 0), "time travel")
+    except RuntimeError as err:
+        assert "time travel" in str(err)
+    else:
+        assert False
+
+
+def test_transaction_pragmas():
+    """Set pragmas for the duration of a transaction"""
+    with transaction(DBNAME, pragmas={'synchronous': 'OFF'}) as conn:
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 0
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 2
+    close_pools(DBNAME)
+    os.remove(DBNAME)
+
+
+def test_text_to_dtypes():
+    """Infer dtypes from text values"""
+    rows = [['1', '1.5', 'a', ''], ['', '2', '3', '']]
+    dtypes = text_to_dtypes(['w', 'x', 'y', 'z'], rows)
+    assert dtypes == [('w', int), ('x', float), ('y', str), ('z', str)]